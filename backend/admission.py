@@ -0,0 +1,310 @@
+# backend/admission.py
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, OrderedDict, deque
+
+import orjson
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+# Admission control: requests are sorted into classes, each with its own
+# concurrency slots, so ad-hoc NL queries (Gemini + arbitrary BigQuery jobs)
+# can never take the slots dashboard reads need. Within a class every user
+# gets at most N requests running; the rest wait in a bounded queue that is
+# served round-robin across users, and anything past the bound is turned
+# away at once with 429 instead of piling up in the threadpool.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# longest a request may wait for a slot before it's turned away (429)
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+# Who a request belongs to: the authenticated principal if an auth layer set
+# one, else the client address. A user-id header is only believed when it's
+# configured AND the connection comes from one of the trusted proxies (which
+# must set / overwrite it); anyone else could rotate it to dodge the
+# per-user limits, or send someone else's id to lock them out.
+ADMISSION_USER_HEADER = os.getenv("ADMISSION_USER_HEADER", "").lower().encode()
+ADMISSION_TRUSTED_PROXIES = frozenset(
+    p.strip() for p in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if p.strip()
+)
+
+
+def _limits(name: str, concurrency: int, queue: int, per_user: int, per_user_queue: int) -> dict:
+    prefix = f"ADMISSION_{name.upper()}_"
+    return {
+        "concurrency": int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+        "queue": int(os.getenv(prefix + "QUEUE", queue)),
+        "per_user": int(os.getenv(prefix + "PER_USER", per_user)),
+        "per_user_queue": int(os.getenv(prefix + "PER_USER_QUEUE", per_user_queue)),
+    }
+
+
+# (class, path prefixes, limits); first match wins, other paths aren't limited.
+# A dashboard opens several panels at once, hence the higher per-user limits.
+ADMISSION_CLASSES = [
+    (
+        "nl",
+        ("/query/run", "/query/nl", "/query/batch", "/gemini/"),
+        _limits("nl", concurrency=8, queue=32, per_user=2, per_user_queue=4),
+    ),
+    (
+        "dashboard",
+        ("/analytics/", "/query/checkpoint", "/query/page", "/snapshots/"),
+        _limits("dashboard", concurrency=32, queue=256, per_user=8, per_user_queue=64),
+    ),
+]
+
+
+class Rejected(Exception):
+    pass
+
+
+class FairScheduler:
+    """
+    Concurrency slots for one request class. A request runs at once when a
+    slot is free, its user is under `per_user` and has nothing queued;
+    otherwise it queues (per-user FIFO, users served round-robin) or is
+    rejected when the queue, or the user's share of it, is full.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue: int, per_user: int, per_user_queue: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue
+        self.per_user = per_user
+        self.per_user_queue = per_user_queue
+        self.active = 0
+        self._active_by_user = Counter()
+        self._queues = OrderedDict()  # user -> deque of futures, in serving order
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits = deque(maxlen=1000)  # seconds, admitted requests only
+
+    def _runnable(self, user: str) -> bool:
+        return self.active < self.concurrency and self._active_by_user[user] < self.per_user
+
+    def _start(self, user: str, waited: float) -> None:
+        self.active += 1
+        self._active_by_user[user] += 1
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def _dispatch(self) -> None:
+        # round-robin: each pass gives every user with queued work one slot
+        progress = True
+        while progress and self.queued and self.active < self.concurrency:
+            progress = False
+            for user in list(self._queues):
+                if not self._runnable(user):
+                    continue
+                waiting = self._queues[user]
+                future, enqueued = waiting.popleft()
+                self.queued -= 1
+                if not waiting:
+                    del self._queues[user]
+                else:
+                    self._queues.move_to_end(user)
+                progress = True
+                if future.done():  # cancelled while queued
+                    continue
+                self._start(user, time.monotonic() - enqueued)
+                future.set_result(None)
+
+    def _remove(self, user: str, future) -> None:
+        waiting = self._queues.get(user)
+        if not waiting:
+            return
+        for entry in waiting:
+            if entry[0] is future:
+                waiting.remove(entry)
+                self.queued -= 1
+                break
+        if not waiting:
+            del self._queues[user]
+
+    async def acquire(self, user: str, max_wait: float = ADMISSION_MAX_WAIT_SECONDS) -> float:
+        """
+        Wait for a slot; returns the seconds waited. Raises Rejected when
+        the queue is full or no slot frees up within `max_wait`.
+        """
+        if self._runnable(user) and user not in self._queues:
+            self._start(user, 0.0)
+            return 0.0
+
+        if self.queued >= self.queue_limit:
+            self.rejected += 1
+            raise Rejected(f"{self.name} queue is full ({self.queue_limit} waiting)")
+        if len(self._queues.get(user, ())) >= self.per_user_queue:
+            self.rejected += 1
+            raise Rejected(
+                f"too many {self.name} requests in flight for this user "
+                f"({self.per_user} running, {self.per_user_queue} queued)"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        self._queues.setdefault(user, deque()).append((future, enqueued))
+        self.queued += 1
+
+        try:
+            async with asyncio.timeout(max_wait):
+                await future
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # got a slot just as we gave up: hand it on
+                self.release(user)
+            else:
+                future.cancel()
+                self._remove(user, future)
+            if isinstance(e, TimeoutError):
+                self.timed_out += 1
+                raise Rejected(f"no {self.name} slot free within {max_wait:.0f}s") from None
+            raise
+        return time.monotonic() - enqueued
+
+    def release(self, user: str) -> None:
+        self.active -= 1
+        self._active_by_user[user] -= 1
+        if self._active_by_user[user] <= 0:
+            del self._active_by_user[user]
+        self._dispatch()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000.0, 2) if waits else None
+
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "active_users": len(self._active_by_user),
+            "queue_limit": self.queue_limit,
+            "queued": self.queued,
+            "queued_users": len(self._queues),
+            "per_user": self.per_user,
+            "per_user_queue": self.per_user_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_p50": pct(0.5),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1] * 1000.0, 2) if waits else None,
+        }
+
+
+schedulers = {name: FairScheduler(name, **limits) for name, _, limits in ADMISSION_CLASSES}
+
+
+def classify(path: str):
+    for name, prefixes, _ in ADMISSION_CLASSES:
+        if path.startswith(prefixes):
+            return name
+    return None
+
+
+def _user(scope) -> str:
+    principal = scope.get("user")
+    if principal is not None and getattr(principal, "is_authenticated", False):
+        return f"user:{principal.display_name}"
+
+    client = scope.get("client")
+    address = client[0] if client else "anonymous"
+
+    if ADMISSION_USER_HEADER and address in ADMISSION_TRUSTED_PROXIES:
+        for name, value in scope.get("headers", []):
+            if name == ADMISSION_USER_HEADER and value:
+                return f"header:{value.decode('latin-1')}"
+    return f"addr:{address}"
+
+
+def _check_user_config() -> None:
+    """
+    Warn when requests can only be told apart by client address: behind a
+    reverse proxy that address is the proxy's, so every user shares one
+    per-user quota and one heavy user can lock everyone else out.
+    """
+    if not ADMISSION_ENABLED or (ADMISSION_USER_HEADER and ADMISSION_TRUSTED_PROXIES):
+        return
+    if ADMISSION_USER_HEADER or ADMISSION_TRUSTED_PROXIES:
+        missing = "ADMISSION_TRUSTED_PROXIES" if ADMISSION_USER_HEADER else "ADMISSION_USER_HEADER"
+        logger.warning(
+            f"[ADMISSION] {missing} is not set, so the user header is never trusted; "
+            f"per-user limits fall back to the client address"
+        )
+        return
+    logger.warning(
+        "[ADMISSION] ADMISSION_USER_HEADER / ADMISSION_TRUSTED_PROXIES are not set: "
+        "per-user limits key on the client address, so behind a reverse proxy "
+        "all users share one quota"
+    )
+
+
+def admission_stats() -> dict:
+    return {
+        "enabled": ADMISSION_ENABLED,
+        **{name: scheduler.stats() for name, scheduler in schedulers.items()},
+    }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that holds each classified request until its class has
+    a slot for it (X-Queue-Wait-Ms on the response says how long), or
+    answers 429 with Retry-After when it can't be admitted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        _check_user_config()
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        scheduler = schedulers[name]
+        user = _user(scope)
+        try:
+            waited = await scheduler.acquire(user)
+        except Rejected as e:
+            logger.warning(f"[ADMISSION] {scope['method']} {scope['path']} user={user} rejected: {e}")
+            await self._reject(send, str(e))
+            return
+
+        if waited:
+            logger.info(f"[ADMISSION] {scope['path']} user={user} waited_ms={waited * 1000:.1f}")
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-queue-wait-ms", f"{waited * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            scheduler.release(user)
+
+    @staticmethod
+    async def _reject(send, message: str):
+        body = orjson.dumps({"status": "error", "message": f"Too many requests: {message}"})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,104 @@
+# backend/bench_startup.py
+import json
+import os
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cold-start benchmark: every route is measured in a fresh interpreter, so
+# the numbers include module imports, app startup (lifespan: warehouse
+# warm-up) and whatever the first request still has to build lazily.
+#
+#   python -m backend.bench_startup            # all routes below
+#   WAREHOUSE_BACKEND=local python -m backend.bench_startup
+BENCH_COURSE_ID = os.getenv("BENCH_COURSE_ID", "100000")
+
+ROUTES = [
+    ("GET", "/", None),
+    ("GET", "/cache/stats", None),
+    ("GET", "/analytics/courses", None),
+    ("POST", "/analytics/course_timeseries", {"course_id": BENCH_COURSE_ID}),
+    ("POST", "/analytics/course_detail", {"course_id": BENCH_COURSE_ID}),
+    ("POST", "/query/nl", {"question": "top 5 courses by late submissions"}),
+    ("POST", "/gemini/test", {"prompt": "Reply with OK."}),
+]
+
+# heavy client libraries; the report shows which ones a route ended up loading
+HEAVY_MODULES = ("google.genai", "google.cloud.bigquery", "googleapiclient")
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000.0, 2)
+
+
+def measure(method: str, path: str, body) -> dict:
+    """
+    Runs inside the child process: import, start, two requests.
+    """
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    result = {"import_ms": _ms(started)}
+
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        result["startup_ms"] = _ms(started)
+
+        for key in ("first_request_ms", "second_request_ms"):
+            started = time.perf_counter()
+            response = client.request(method, path, json=body)
+            result[key] = _ms(started)
+            result["status"] = response.status_code
+
+    result["loaded"] = [m for m in HEAVY_MODULES if m in sys.modules]
+    return result
+
+
+def run(routes: list = ROUTES) -> list:
+    results = []
+    for method, path, body in routes:
+        proc = subprocess.run(
+            [sys.executable, "-m", "backend.bench_startup", "--child", method, path, json.dumps(body)],
+            capture_output=True,
+            text=True,
+        )
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            results.append({"route": f"{method} {path}", "error": proc.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append({"route": f"{method} {path}", **json.loads(lines[-1])})
+    return results
+
+
+def report(results: list) -> str:
+    header = f"{'route':<36} {'import':>8} {'startup':>8} {'1st req':>8} {'2nd req':>8} {'status':>6}  loaded"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['route']:<36} error: {r['error']}")
+            continue
+        lines.append(
+            f"{r['route']:<36} {r['import_ms']:>8.1f} {r['startup_ms']:>8.1f} "
+            f"{r['first_request_ms']:>8.1f} {r['second_request_ms']:>8.1f} {r['status']:>6}  "
+            f"{', '.join(r['loaded']) or '-'}"
+        )
+    lines.append("(ms; each route in a fresh process)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        _, _, method, path, body = sys.argv
+        # keep the app's request logging out of the result line
+        import logging
+
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(measure(method, path, json.loads(body))))
+    else:
+        print(report(run()))
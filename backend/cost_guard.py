@@ -0,0 +1,46 @@
+# backend/cost_guard.py
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# User-driven (generated) SQL is dry-run first and judged on its estimate:
+#   <= QUERY_CONFIRM_BYTES                 -> run
+#   <= QUERY_MAX_BYTES                     -> client must confirm first
+#   >  QUERY_MAX_BYTES                     -> rejected
+# Accepted queries run with maximum_bytes_billed set, so a job can never
+# bill more than its estimate (plus headroom) or QUERY_MAX_BYTES.
+QUERY_CONFIRM_BYTES = int(os.getenv("QUERY_CONFIRM_BYTES", str(1024 ** 3)))  # 1 GiB
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(10 * 1024 ** 3)))  # 10 GiB
+
+# BigQuery bills at least 10 MB per query, so no cap may be lower than that
+MIN_BILLED_BYTES = 10 * 1024 ** 2
+
+# estimates can move a little between dry run and run (e.g. new data)
+CAP_HEADROOM = 1.25
+
+
+def decide(estimated_bytes, approved_bytes: int = None) -> str:
+    """
+    "run", "confirm" or "reject" for a dry-run estimate. `approved_bytes` is
+    what the client already confirmed (from a confirmation token).
+    None estimates (backends without dry-run costs) always run.
+    """
+    if estimated_bytes is None:
+        return "run"
+    if estimated_bytes > QUERY_MAX_BYTES:
+        return "reject"
+    if estimated_bytes > QUERY_CONFIRM_BYTES:
+        if approved_bytes is None or estimated_bytes > approved_bytes * CAP_HEADROOM:
+            return "confirm"
+    return "run"
+
+
+def bytes_cap(estimated_bytes) -> int:
+    """
+    maximum_bytes_billed for an accepted query.
+    """
+    if estimated_bytes is None:
+        return QUERY_MAX_BYTES
+    return min(QUERY_MAX_BYTES, max(int(estimated_bytes * CAP_HEADROOM), MIN_BILLED_BYTES))
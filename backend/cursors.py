@@ -0,0 +1,52 @@
+# backend/cursors.py
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+
+import orjson
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cursors name a warehouse result table, so they are signed: a client can
+# only page through results the server handed out. Set CURSOR_SECRET when
+# running more than one worker so every worker accepts every cursor.
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or secrets.token_hex(32)).encode()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(state: dict) -> str:
+    """
+    Opaque, URL-safe token for a pagination state dict.
+    """
+    payload = orjson.dumps(state)
+    token = _sign(payload) + payload
+    return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Inverse of encode_cursor(). Raises InvalidCursor on tampering / garbage.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+
+    signature, payload = raw[:16], raw[16:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidCursor("Invalid cursor")
+
+    try:
+        return orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        raise InvalidCursor("Malformed cursor")
@@ -1,17 +1,25 @@
 # backend/dashboard_refresh.py
+import logging
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from google.cloud import bigquery
+
+from backend import local_mirror
+from backend import refresh_state
+from backend import snapshots
+from backend.warehouse import get_warehouse
 
 load_dotenv()
 
+logger = logging.getLogger("cloudreign")
+
 PROJECT_ID = os.getenv("PROJECT_ID")
 DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
-SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")
 
 DASHBOARD_REFRESH_SQL = f"""
 CREATE OR REPLACE TABLE `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
-PARTITION BY DATE(ingestion_time)
+PARTITION BY metric_date
+CLUSTER BY app, course_id
 OPTIONS(
   description = "App-specific daily metrics for dashboards"
 )
@@ -37,7 +45,7 @@ WITH base AS (
   ON
     s.course_id = e.course_id
   GROUP BY
-    course_id,
+    s.course_id,
     metric_date
 )
 SELECT
@@ -54,23 +62,95 @@ SELECT
   late_submissions,
   avg_grade,
   max_grade,
-  CURRENT_TIMESTAMP() AS ingestion_time
+  @ingestion_time AS ingestion_time
 FROM
   base;
 """
 
+# granularity -> table the timeseries routes read. Weekly / monthly rollups
+# are rebuilt from dashboard_temp on every refresh, so long windows read a
+# few rows per course instead of one per day.
+TIMESERIES_TABLES = {
+    "day": "dashboard_temp",
+    "week": "dashboard_temp_weekly",
+    "month": "dashboard_temp_monthly",
+}
+
+
+def _rollup_sql(table: str, period: str) -> str:
+    return f"""
+CREATE OR REPLACE TABLE `{PROJECT_ID}.{DATASET_ID}.{table}`
+CLUSTER BY app, course_id
+OPTIONS(
+  description = "dashboard_temp rolled up by {period}"
+)
+AS
+SELECT
+  app,
+  course_id,
+  CAST(DATE_TRUNC(metric_date, {period}) AS DATE) AS metric_date,
+  SUM(total_submissions) AS total_submissions,
+  SUM(turned_in_submissions) AS turned_in_submissions,
+  SUM(returned_submissions) AS returned_submissions,
+  SUM(late_submissions) AS late_submissions,
+  -- daily averages weighted by that day's submissions
+  SAFE_DIVIDE(
+    SUM(avg_grade * total_submissions),
+    SUM(IF(avg_grade IS NULL, 0, total_submissions))
+  ) AS avg_grade,
+  MAX(max_grade) AS max_grade,
+  MAX(ingestion_time) AS ingestion_time
+FROM
+  `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
+GROUP BY
+  1, 2, 3;
+"""
+
+
+DASHBOARD_ROLLUP_SQL = {
+    "week": _rollup_sql(TIMESERIES_TABLES["week"], "WEEK(MONDAY)"),
+    "month": _rollup_sql(TIMESERIES_TABLES["month"], "MONTH"),
+}
+
+
 def run() -> int:
     """
     Rebuilds dashboard_temp and returns row count.
     """
-    client = bigquery.Client.from_service_account_json(
-        SERVICE_ACCOUNT_FILE,
-        project=PROJECT_ID,
-    )
+    warehouse = get_warehouse()
 
-    job = client.query(DASHBOARD_REFRESH_SQL)
-    job.result()  # wait for completion
+    # bound instead of CURRENT_TIMESTAMP(), so ingestion_time and the
+    # refresh state (ETag / Last-Modified) carry the same instant
+    ingestion_time = datetime.now(timezone.utc)
+    warehouse.execute(
+        DASHBOARD_REFRESH_SQL, {"ingestion_time": ingestion_time}
+    )  # waits for completion
+
+    for rollup_sql in DASHBOARD_ROLLUP_SQL.values():
+        warehouse.execute(rollup_sql)
 
     table_ref = f"{PROJECT_ID}.{DATASET_ID}.dashboard_temp"
-    table = client.get_table(table_ref)
-    return table.num_rows
+    num_rows = warehouse.num_rows(table_ref)
+
+    # invalidates cached analytics responses in every worker, and the local
+    # mirror until it holds a copy of this generation
+    generation = refresh_state.bump(refreshed_at=ingestion_time.timestamp())
+
+    # optional serving mode: mirror the fresh table to local Parquet; if
+    # this fails, routes keep reading the warehouse
+    if local_mirror.LOCAL_MIRROR_ENABLED:
+        try:
+            local_mirror.refresh(
+                warehouse, tables=tuple(TIMESERIES_TABLES.values()), generation=generation
+            )
+        except Exception:
+            logger.exception("[MIRROR] refresh after the dashboard_temp rebuild failed")
+
+    # post-refresh stage: pre-rendered default payloads for the static route
+    if snapshots.SNAPSHOTS_ENABLED:
+        try:
+            snapshots.render(warehouse, generation)
+        except Exception:
+            logger.exception(f"[SNAPSHOT] render for generation {generation} failed")
+
+    return num_rows
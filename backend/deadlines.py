@@ -0,0 +1,162 @@
+# backend/deadlines.py
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+import orjson
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+# Every /query/* and /analytics/* request gets a deadline: the time budget
+# for producing a response. Clients can ask for less with X-Request-Timeout
+# (seconds). Warehouse jobs are cancelled when it passes or the client leaves.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+DEADLINE_PATH_PREFIXES = ("/query/", "/analytics/")
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+stats = {"requests": 0, "deadline_exceeded": 0, "disconnected": 0}
+
+
+def remaining():
+    """
+    Seconds left before the current request's deadline (None outside a request).
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _timeout_from_headers(scope) -> float:
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-timeout":
+            try:
+                requested = float(value)
+            except ValueError:
+                break
+            if requested > 0:
+                return min(requested, REQUEST_DEADLINE_SECONDS)
+    return REQUEST_DEADLINE_SECONDS
+
+
+class RequestDeadlineMiddleware:
+    """
+    ASGI middleware that runs each request as a task and cancels it when
+    - the deadline passes before the response starts (-> 504), or
+    - the client disconnects (no response; nobody is listening).
+    Cancellation reaches Warehouse._run_job_async, which cancels the job.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(DEADLINE_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        stats["requests"] += 1
+        timeout = _timeout_from_headers(scope)
+        _deadline.set(time.monotonic() + timeout)
+
+        disconnected = asyncio.Event()
+        response_started = asyncio.Event()
+        response_complete = asyncio.Event()
+        messages = asyncio.Queue()
+
+        async def pump():
+            # sole reader of `receive`: buffers the body for the app and
+            # notices the disconnect even if the app never reads again
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def wrapped_receive():
+            if disconnected.is_set() and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                response_started.set()
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete.set()
+            await send(message)
+
+        app_task = asyncio.ensure_future(self.app(scope, wrapped_receive, wrapped_send))
+        watcher = asyncio.ensure_future(pump())
+        disconnect_wait = asyncio.ensure_future(disconnected.wait())
+        started_wait = asyncio.ensure_future(response_started.wait())
+
+        try:
+            # phase 1: until the response starts, the deadline applies
+            done, _ = await asyncio.wait(
+                {app_task, disconnect_wait, started_wait},
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                stats["deadline_exceeded"] += 1
+                logger.warning(
+                    f"[DEADLINE] {scope['method']} {scope['path']} exceeded {timeout:.1f}s, cancelling"
+                )
+                await self._cancel(app_task)
+                await self._timeout_response(send, timeout)
+                return
+
+            # phase 2: response is streaming (or finished); only a disconnect
+            # stops it. Servers also send http.disconnect once a complete
+            # response is out; that's the normal end, not a client leaving.
+            if not app_task.done():
+                await asyncio.wait({app_task, disconnect_wait}, return_when=asyncio.FIRST_COMPLETED)
+
+            if response_complete.is_set():
+                await app_task
+                return
+
+            if not app_task.done():
+                stats["disconnected"] += 1
+                logger.info(f"[DISCONNECT] {scope['method']} {scope['path']} client left, cancelling")
+                await self._cancel(app_task)
+                return
+
+            app_task.result()
+        finally:
+            for task in (watcher, disconnect_wait, started_wait):
+                task.cancel()
+            if not app_task.done():
+                app_task.cancel()
+
+    @staticmethod
+    async def _cancel(task):
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    @staticmethod
+    async def _timeout_response(send, timeout: float):
+        body = orjson.dumps(
+            {"status": "error", "message": f"Request deadline of {timeout:.1f}s exceeded"}
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,63 @@
+# backend/downsample.py
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bound on points per series returned by the timeseries routes
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "1000"))
+
+
+def lttb_indices(x: list, y: list, threshold: int) -> list:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    the visual shape of the (x, y) series. First and last points are kept.
+    """
+    n = len(x)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+
+    for i in range(threshold - 2):
+        # average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / count
+        avg_y = sum(y[next_start:next_end]) / count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = x[a], y[a]
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+
+        picked.append(best)
+        a = best
+
+    picked.append(n - 1)
+    return picked
+
+
+def downsample(table, max_points: int, x: str = "metric_date", y: str = "total_submissions"):
+    """
+    Keep at most `max_points` rows of a pyarrow.Table sorted by `x`, choosing
+    them with LTTB on the `y` column. Whole rows are kept, so every metric
+    column stays aligned with its date.
+    """
+    if table.num_rows <= max_points:
+        return table
+
+    xs = [d.toordinal() if d is not None else 0 for d in table.column(x).to_pylist()]
+    ys = [float(v) if v is not None else 0.0 for v in table.column(y).to_pylist()]
+    return table.take(lttb_indices(xs, ys, max_points))
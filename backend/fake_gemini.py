@@ -0,0 +1,119 @@
+# backend/fake_gemini.py
+import asyncio
+import json
+import os
+import random
+import re
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+load_dotenv()
+
+# Stand-in for the Gemini API, for testing timeouts, streaming and hedging
+# without a key or network:
+#
+#   python -m backend.fake_gemini
+#   GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake uvicorn backend.main:app
+#
+# Answers every prompt with one fenced query per question (then some chatter
+# the client shouldn't wait for), streamed in chunks. A share of calls is slow so the
+# p95 hedge has something to cut off.
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+FAKE_GEMINI_PORT = int(os.getenv("FAKE_GEMINI_PORT", "8765"))
+FAKE_GEMINI_LATENCY_MS = float(os.getenv("FAKE_GEMINI_LATENCY_MS", "300"))
+FAKE_GEMINI_SLOW_RATE = float(os.getenv("FAKE_GEMINI_SLOW_RATE", "0.03"))
+FAKE_GEMINI_SLOW_MS = float(os.getenv("FAKE_GEMINI_SLOW_MS", "5000"))
+FAKE_GEMINI_CHUNK_MS = float(os.getenv("FAKE_GEMINI_CHUNK_MS", "50"))
+FAKE_GEMINI_SQL = os.getenv(
+    "FAKE_GEMINI_SQL",
+    f"""SELECT course_id, ANY_VALUE(course_name) AS course_name, SUM(total_submissions) AS total_submissions
+FROM `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
+WHERE app = 'classroom' AND metric_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
+GROUP BY course_id
+ORDER BY total_submissions DESC""",
+)
+
+app = FastAPI()
+
+stats = {"requests": 0, "slow": 0, "chunks_sent": 0, "cancelled": 0}
+
+
+def _answer(prompt: str) -> list:
+    # batch prompts number their questions "Q1: ...", "Q2: ..."
+    labels = re.findall(r"^Q(\d+):", prompt, flags=re.MULTILINE) or [None]
+    chunks = []
+    for label in labels:
+        chunks += ["```sql\n", f"-- Q{label}\n" if label else "", FAKE_GEMINI_SQL, "\n```\n"]
+    return chunks + [
+        "This query sums submissions per course over the last 30 days",
+        " and orders the courses from most to least active.",
+    ]
+
+
+def _prompt(body: bytes) -> str:
+    try:
+        contents = json.loads(body)["contents"]
+        return "\n".join(part.get("text", "") for c in contents for part in c["parts"])
+    except (ValueError, KeyError, TypeError):
+        return ""
+
+
+def _response(text: str) -> dict:
+    return {
+        "candidates": [
+            {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        ],
+        "modelVersion": "fake-gemini",
+    }
+
+
+async def _first_token_delay() -> None:
+    stats["requests"] += 1
+    delay = FAKE_GEMINI_LATENCY_MS
+    if random.random() < FAKE_GEMINI_SLOW_RATE:
+        stats["slow"] += 1
+        delay = FAKE_GEMINI_SLOW_MS
+    await asyncio.sleep(delay / 1000.0)
+
+
+# "/v1beta/models/gemini-2.0-flash:generateContent" (the action follows a colon)
+@app.post("/{version}/models/{model_action}")
+async def generate(version: str, model_action: str, request: Request):
+    prompt = _prompt(await request.body())
+    _, _, action = model_action.partition(":")
+
+    if action == "generateContent":
+        await _first_token_delay()
+        return JSONResponse(_response("".join(_answer(prompt))))
+
+    if action == "streamGenerateContent":
+
+        async def events():
+            await _first_token_delay()
+            try:
+                for text in _answer(prompt):
+                    stats["chunks_sent"] += 1
+                    yield f"data: {json.dumps(_response(text))}\r\n\r\n"
+                    await asyncio.sleep(FAKE_GEMINI_CHUNK_MS / 1000.0)
+            except asyncio.CancelledError:
+                stats["cancelled"] += 1
+                raise
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return JSONResponse(status_code=404, content={"error": {"message": f"Unknown action {action!r}"}})
+
+
+@app.get("/stats")
+def fake_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=FAKE_GEMINI_PORT)
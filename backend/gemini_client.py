@@ -1,41 +1,97 @@
 # backend/gemini_client.py
+import asyncio
+import logging
 import os
 import re
+import threading
+import time
+from collections import deque
+
 from dotenv import load_dotenv
-import google.genai as genai
+
+from backend import deadlines
 
 load_dotenv()
 
+logger = logging.getLogger("cloudreign")
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# point the client somewhere else, e.g. backend/fake_gemini.py for testing
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+# Deadline for one model call (all hedged attempts together). Inside a
+# /query/* request it is also cut to what's left of the request deadline.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "20"))
+
+# Hedging: if a call is still running after the p95 of recent call
+# latencies, send the same request again and take whichever answers first.
+# Costs at most ~5% extra calls; cuts off the slow tail.
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "false").lower() == "true"
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_MIN_DELAY_MS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_MS", "250"))
+
+# seconds per successful call, hedge included (so a won hedge doesn't hide
+# the slow attempt it replaced)
+_latencies = deque(maxlen=200)
 
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY is not set in environment")
+stats = {
+    "calls": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "stopped_at_fence": 0,
+}
 
-client = genai.Client(api_key=GEMINI_API_KEY)
 
+class GeminiTimeout(TimeoutError):
+    pass
 
-def _extract_text(response) -> str:
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
     """
-    Flatten a google.genai response into a plain text string.
+    Shared genai.Client, built on first use. Importing google.genai takes
+    most of a second, and workers that never call Gemini (analytics only,
+    template / cached answers) shouldn't need it or GEMINI_API_KEY to start.
     """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not GEMINI_API_KEY:
+                    raise RuntimeError("GEMINI_API_KEY is not set in environment")
+                import google.genai as genai
+                from google.genai import types
+
+                # backstop; calls are normally bounded by _timeout() first
+                _client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options=types.HttpOptions(
+                        base_url=GEMINI_BASE_URL,
+                        timeout=int(GEMINI_TIMEOUT_SECONDS * 1000),
+                    ),
+                )
+    return _client
+
+
+def _text_parts(response) -> list:
     parts = []
-    for cand in response.candidates:
+    for cand in response.candidates or []:
+        if cand.content is None or not cand.content.parts:
+            continue
         for part in cand.content.parts:
             if hasattr(part, "text") and part.text:
                 parts.append(part.text)
-    return "\n".join(parts).strip()
+    return parts
 
 
-def generate_text(prompt: str) -> str:
-    """
-    Simple text generation helper (for /gemini/test).
-    """
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt,
-    )
-    return _extract_text(response)
+_FENCED = re.compile(r"```(?:sql|bigquery)?\s*(.*?)```", flags=re.DOTALL | re.IGNORECASE)
+_STATEMENT_START = re.compile(r"^\s*((?:WITH|SELECT)\b)", flags=re.MULTILINE | re.IGNORECASE)
+_BATCH_LABEL = re.compile(r"--\s*Q(\d+)\b[^\n]*\n?", flags=re.IGNORECASE)
 
 
 def _extract_sql(raw: str) -> str:
@@ -44,22 +100,23 @@ def _extract_sql(raw: str) -> str:
 
     - If there's a ```sql``` or ```bigquery``` fenced block, take that.
     - Strip language prefixes like "sql\nSELECT" or "bigquery\nSELECT".
-    - Trim everything before the first SELECT.
+    - Trim everything before the statement (a line starting with WITH or
+      SELECT, else the first SELECT), so CTE queries keep their WITH.
     - Remove trailing semicolon.
     """
     # 1) fenced code block
-    m = re.search(
-        r"```(?:sql|bigquery)?\s*(.*?)```",
-        raw,
-        flags=re.DOTALL | re.IGNORECASE,
-    )
+    m = _FENCED.search(raw)
     if m:
         raw = m.group(1).strip()
 
-    # 2) find first SELECT
-    idx = raw.upper().find("SELECT")
-    if idx != -1:
-        raw = raw[idx:]
+    # 2) find the start of the statement
+    m = _STATEMENT_START.search(raw)
+    if m:
+        raw = raw[m.start(1):]
+    else:
+        idx = raw.upper().find("SELECT")
+        if idx != -1:
+            raw = raw[idx:]
 
     # 3) cleanup
     raw = raw.strip()
@@ -69,14 +126,150 @@ def _extract_sql(raw: str) -> str:
     return raw
 
 
-def generate_sql(prompt: str) -> str:
+# --------- async path: deadlines, streaming, hedging ---------
+def _p95() -> float:
+    ordered = sorted(_latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def hedge_delay():
+    """
+    Seconds to wait before sending a hedged duplicate, or None when
+    hedging is off or there aren't enough samples for a p95 yet.
+    """
+    if not GEMINI_HEDGE or len(_latencies) < GEMINI_HEDGE_MIN_SAMPLES:
+        return None
+    return max(_p95(), GEMINI_HEDGE_MIN_DELAY_MS / 1000.0)
+
+
+def _timeout() -> float:
+    remaining = deadlines.remaining()
+    if remaining is None:
+        return GEMINI_TIMEOUT_SECONDS
+    return max(min(GEMINI_TIMEOUT_SECONDS, remaining), 0.0)
+
+
+async def _stream(prompt: str, blocks: int) -> str:
     """
-    Generate SQL from a prompt and normalize it so it starts with SELECT.
+    One streamed generate_content call. With `blocks`, stop reading (and
+    close the stream) once that many complete ```sql``` blocks have
+    arrived; whatever the model says after them is never waited for.
     """
-    response = client.models.generate_content(
+    stream = await get_client().aio.models.generate_content_stream(
         model=GEMINI_MODEL,
         contents=prompt,
     )
-    text = _extract_text(response)
-    sql = _extract_sql(text)
-    return sql
+    chunks = []
+    try:
+        async for chunk in stream:
+            # chunks split mid-line; join them as-is
+            chunks.extend(_text_parts(chunk))
+            if blocks and len(_FENCED.findall("".join(chunks))) >= blocks:
+                stats["stopped_at_fence"] += 1
+                break
+    finally:
+        await stream.aclose()
+    return "".join(chunks).strip()
+
+
+async def _first_success(tasks: set, hedge):
+    """
+    Result of the first task in `tasks` to succeed; if all fail, the
+    last error. Tasks still running afterwards are left to the caller.
+    """
+    error = None
+    while tasks:
+        done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                if task is hedge:
+                    stats["hedge_wins"] += 1
+                return task.result()
+            error = task.exception()
+    raise error
+
+
+async def _call(prompt: str, blocks: int = 0) -> str:
+    stats["calls"] += 1
+    timeout = _timeout()
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(_stream(prompt, blocks))
+    tasks = {primary}
+    hedge = None
+    try:
+        async with asyncio.timeout(timeout):
+            delay = hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    stats["hedged"] += 1
+                    logger.info(f"[GEMINI] no answer after {delay * 1000:.0f}ms (p95), hedging")
+                    hedge = asyncio.ensure_future(_stream(prompt, blocks))
+                    tasks.add(hedge)
+            text = await _first_success(set(tasks), hedge)
+        _latencies.append(time.perf_counter() - started)
+        return text
+    except TimeoutError:
+        stats["timeouts"] += 1
+        raise GeminiTimeout(f"Gemini did not answer within {timeout:.1f}s") from None
+    except Exception:
+        stats["errors"] += 1
+        raise
+    finally:
+        # the loser of a hedge, or everything on timeout / cancellation
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def generate_text_async(prompt: str) -> str:
+    """
+    Plain text generation (for /gemini/test), with a deadline (and hedging,
+    if enabled).
+    """
+    return await _call(prompt)
+
+
+async def generate_sql_async(prompt: str) -> str:
+    """
+    SQL for a prompt, normalized to start with SELECT, with a deadline (and
+    hedging, if enabled); the response is streamed and reading stops at the
+    closing SQL fence.
+    """
+    return _extract_sql(await _call(prompt, blocks=1))
+
+
+async def generate_sql_batch_async(prompt: str, count: int) -> list:
+    """
+    SQL for `count` numbered questions asked in one prompt (see
+    prompt_builder.build_batch_sql_prompt): one entry per question, None
+    where the model didn't answer it. Blocks are matched to questions by
+    their "-- Q<n>" label, falling back to their order.
+    """
+    text = await _call(prompt, blocks=count)
+    answers = [None] * count
+    unlabelled = []
+    for block in _FENCED.findall(text):
+        block = block.strip()
+        m = _BATCH_LABEL.match(block)
+        n = int(m.group(1)) if m else 0
+        if 1 <= n <= count and answers[n - 1] is None:
+            answers[n - 1] = _extract_sql(block[m.end():])
+        else:
+            unlabelled.append(_extract_sql(block))
+    for i in range(count):
+        if answers[i] is None and unlabelled:
+            answers[i] = unlabelled.pop(0)
+    return answers
+
+
+def gemini_stats() -> dict:
+    delay = hedge_delay()
+    return {
+        **stats,
+        "hedge": GEMINI_HEDGE,
+        "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        "p95_ms": round(_p95() * 1000, 1) if _latencies else None,
+        "samples": len(_latencies),
+        "timeout_seconds": GEMINI_TIMEOUT_SECONDS,
+    }
@@ -5,8 +5,24 @@ from datetime import datetime, timezone
 
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from google.cloud import bigquery
-from google.cloud.bigquery import Dataset, Table, SchemaField
+from google.cloud.bigquery import SchemaField
+
+from backend.warehouse import get_warehouse
+
+ENROLLMENTS_SCHEMA = [
+    SchemaField("course_id", "STRING"),
+    SchemaField("course_name", "STRING"),
+    SchemaField("section", "STRING"),
+    SchemaField("course_state", "STRING"),
+    SchemaField("course_creation_time", "TIMESTAMP"),
+    SchemaField("user_id", "STRING"),
+    SchemaField("user_email", "STRING"),
+    SchemaField("role", "STRING"),
+    SchemaField("enrollment_time", "TIMESTAMP"),
+    SchemaField("primary_teacher", "BOOL"),
+    SchemaField("domain", "STRING"),
+    SchemaField("ingestion_time", "TIMESTAMP"),
+]
 
 def run():
     load_dotenv()
@@ -139,57 +155,16 @@ def run():
 
     print(f"Built {len(rows)} enrollment rows")
 
-    # BigQuery load
-    bq_client = bigquery.Client.from_service_account_json(
-        SERVICE_ACCOUNT_FILE,
-        project=PROJECT_ID,
-    )
-
-    dataset_ref = f"{PROJECT_ID}.{DATASET_ID}"
-    table_ref = f"{dataset_ref}.{ENROLLMENTS_TABLE_ID}"
-
-    # dataset ensure
-    try:
-        dataset = Dataset(dataset_ref)
-        dataset.location = BQ_LOCATION
-        bq_client.create_dataset(dataset, exists_ok=True)
-    except Exception as e:
-        print("Dataset create/check error:", e)
-
-    # schema must match existing table; we only need it if table might not exist
-    schema = [
-        SchemaField("course_id", "STRING"),
-        SchemaField("course_name", "STRING"),
-        SchemaField("section", "STRING"),
-        SchemaField("course_state", "STRING"),
-        SchemaField("course_creation_time", "TIMESTAMP"),
-        SchemaField("user_id", "STRING"),
-        SchemaField("user_email", "STRING"),
-        SchemaField("role", "STRING"),
-        SchemaField("enrollment_time", "TIMESTAMP"),
-        SchemaField("primary_teacher", "BOOL"),
-        SchemaField("domain", "STRING"),
-        SchemaField("ingestion_time", "TIMESTAMP"),
-    ]
-
-    try:
-        table = Table(table_ref, schema=schema)
-        bq_client.create_table(table, exists_ok=True)
-    except Exception as e:
-        print("Table create error (maybe existed):", e)
+    # warehouse load (BigQuery, or the local stand-in)
+    warehouse = get_warehouse()
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.{ENROLLMENTS_TABLE_ID}"
 
+    num_rows = warehouse.load_rows(table_ref, rows, ENROLLMENTS_SCHEMA, location=BQ_LOCATION)
     if rows:
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
-        )
-        load_job = bq_client.load_table_from_json(rows, table_ref, job_config=job_config)
-        load_job.result()
-        dest = bq_client.get_table(table_ref)
-        print(f"Loaded {dest.num_rows} rows into {table_ref}")
-        return dest.num_rows
+        print(f"Loaded {num_rows} rows into {table_ref}")
     else:
         print("No enrollments to insert.")
-        return 0
+    return num_rows
 
 
 if __name__ == "__main__":
@@ -1,9 +1,24 @@
 from dotenv import load_dotenv
 import os
-from google.cloud import bigquery
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from google.cloud.bigquery import Dataset, Table, SchemaField
+from google.cloud.bigquery import SchemaField
+
+from backend.warehouse import get_warehouse
+
+COURSES_SCHEMA = [
+    SchemaField("course_id", "STRING"),
+    SchemaField("name", "STRING"),
+    SchemaField("section", "STRING"),
+    SchemaField("description", "STRING"),
+    SchemaField("room", "STRING"),
+    SchemaField("owner_id", "STRING"),
+    SchemaField("creation_time", "TIMESTAMP"),
+    SchemaField("update_time", "TIMESTAMP"),
+    SchemaField("enrollment_code", "STRING"),
+    SchemaField("course_state", "STRING"),
+    SchemaField("alternate_link", "STRING"),
+]
 
 
 def run() -> int:
@@ -67,67 +82,18 @@ def run() -> int:
             }
         )
 
-    # === BigQuery client (no DWD needed here) ===
+    # === Warehouse load (no DWD needed here) ===
     # BigQuery just needs normal service account IAM perms on the project/dataset
-    bq_client = bigquery.Client.from_service_account_json(
-        SERVICE_ACCOUNT_FILE,
-        project=PROJECT_ID,
-    )
-
-    dataset_ref = f"{PROJECT_ID}.{DATASET_ID}"
-
-    # create dataset if not exists
-    try:
-        dataset = Dataset(dataset_ref)
-        dataset.location = BQ_LOCATION
-        bq_client.create_dataset(dataset, exists_ok=True)
-        print("Dataset ready:", dataset_ref)
-    except Exception as e:
-        print("Dataset create/check error:", e)
-
-    # define schema
-    schema = [
-        SchemaField("course_id", "STRING"),
-        SchemaField("name", "STRING"),
-        SchemaField("section", "STRING"),
-        SchemaField("description", "STRING"),
-        SchemaField("room", "STRING"),
-        SchemaField("owner_id", "STRING"),
-        SchemaField("creation_time", "TIMESTAMP"),
-        SchemaField("update_time", "TIMESTAMP"),
-        SchemaField("enrollment_code", "STRING"),
-        SchemaField("course_state", "STRING"),
-        SchemaField("alternate_link", "STRING"),
-    ]
-
-    table_ref = f"{dataset_ref}.{TABLE_ID}"
-    table = Table(table_ref, schema=schema)
-    try:
-        bq_client.create_table(table, exists_ok=True)
-        print("Table ready:", table_ref)
-    except Exception as e:
-        print("Table create error (maybe existed):", e)
+    warehouse = get_warehouse()
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
 
-    # Insert rows using a load job (works on free tier)
+    # Insert rows using a load job (works on free tier), overwrite table each run
+    num_rows = warehouse.load_rows(table_ref, rows, COURSES_SCHEMA, location=BQ_LOCATION)
     if rows:
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE  # overwrite table each run
-        )
-
-        load_job = bq_client.load_table_from_json(
-            rows,
-            table_ref,  # "project.dataset.table"
-            job_config=job_config,
-        )
-
-        load_job.result()  # wait for job to finish
-
-        dest_table = bq_client.get_table(table_ref)
-        print(f"Loaded {dest_table.num_rows} rows into {table_ref}")
-        return dest_table.num_rows
+        print(f"Loaded {num_rows} rows into {table_ref}")
     else:
         print("No rows to insert.")
-        return 0
+    return num_rows
 
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+# backend/local_mirror.py
+import json
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+from backend import refresh_state
+from backend.serialization import decimals_to_float
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+# Optional serving mode: keep a local Parquet copy of dashboard_temp and
+# answer the dashboard routes from DuckDB instead of BigQuery.
+LOCAL_MIRROR_ENABLED = os.getenv("LOCAL_MIRROR_ENABLED", "false").lower() in ("1", "true", "yes")
+LOCAL_MIRROR_DIR = os.getenv("LOCAL_MIRROR_DIR", "local_mirror")
+LOCAL_MIRROR_MAX_AGE_SECONDS = int(os.getenv("LOCAL_MIRROR_MAX_AGE_SECONDS", "86400"))
+
+PARQUET_FILE = os.path.join(LOCAL_MIRROR_DIR, "dashboard_temp.parquet")
+META_FILE = os.path.join(LOCAL_MIRROR_DIR, "dashboard_temp.meta.json")
+
+
+# --------- LOCAL SQL (DuckDB dialect, same shape as the BigQuery routes) ---------
+# The timeseries queries take {table}: dashboard_temp or one of its rollups.
+CHECKPOINT_SQL = """
+SELECT
+  app,
+  metric_date,
+  course_id,
+  course_name,
+  section,
+  primary_teacher_email,
+  total_students,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade,
+  ingestion_time
+FROM dashboard_temp
+WHERE app = $app
+ORDER BY metric_date DESC
+LIMIT $limit
+"""
+
+COURSES_SQL = """
+SELECT
+  course_id,
+  ANY_VALUE(course_name) AS course_name,
+  ANY_VALUE(section) AS section,
+  ANY_VALUE(primary_teacher_email) AS primary_teacher_email
+FROM dashboard_temp
+WHERE app = 'classroom'
+GROUP BY course_id
+ORDER BY course_name
+"""
+
+COURSE_META_SQL = """
+SELECT
+  app,
+  metric_date,
+  course_id,
+  course_name,
+  section,
+  primary_teacher_email,
+  total_students,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade
+FROM dashboard_temp
+WHERE app = $app
+  AND course_id = $course_id
+ORDER BY metric_date DESC
+LIMIT 1
+"""
+
+COURSE_TIMESERIES_SQL = """
+SELECT
+  metric_date,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade
+FROM {table}
+WHERE app = $app
+  AND course_id = $course_id
+  AND metric_date BETWEEN CAST($as_of AS DATE) - CAST($days AS INTEGER) AND $as_of
+ORDER BY metric_date
+"""
+
+COURSE_TIMESERIES_BATCH_SQL = """
+SELECT
+  course_id,
+  metric_date,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade
+FROM {table}
+WHERE app = $app
+  AND ($all_courses OR list_contains($course_ids, course_id))
+  AND metric_date BETWEEN CAST($as_of AS DATE) - CAST($days AS INTEGER) AND $as_of
+ORDER BY course_id, metric_date
+"""
+
+COURSE_IDS_SQL = """
+SELECT DISTINCT course_id
+FROM {table}
+WHERE app = $app
+ORDER BY course_id
+"""
+
+
+def _read_meta():
+    try:
+        with open(META_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _parquet_file(table: str) -> str:
+    return os.path.join(LOCAL_MIRROR_DIR, f"{table}.parquet")
+
+
+def is_fresh() -> bool:
+    """
+    True when the mirror is enabled, present on disk, was copied for the
+    current refresh generation and is younger than LOCAL_MIRROR_MAX_AGE_SECONDS.
+    Routes fall back to BigQuery otherwise: after a refresh whose mirror
+    copy failed, the old Parquet must not be served (and cached) as the new
+    generation's data.
+    """
+    if not LOCAL_MIRROR_ENABLED:
+        return False
+
+    meta = _read_meta()
+    if not meta or not os.path.exists(PARQUET_FILE):
+        return False
+    if meta.get("generation") != refresh_state.current_generation():
+        return False
+    if not all(os.path.exists(_parquet_file(t)) for t in meta.get("tables", [])):
+        return False
+
+    age = time.time() - meta.get("mirrored_at", 0)
+    return age <= LOCAL_MIRROR_MAX_AGE_SECONDS
+
+
+def refresh(warehouse, tables: tuple = ("dashboard_temp",), generation: int = None) -> int:
+    """
+    Copy dashboard_temp (and any rollup `tables`) from the warehouse into
+    local Parquet files, one view per table, recorded as a copy of refresh
+    `generation` (default: the current one).
+    Called by dashboard_refresh.run after the bump. Returns rows mirrored.
+    """
+    if generation is None:
+        generation = refresh_state.current_generation()
+    import pyarrow.parquet as pq
+
+    os.makedirs(LOCAL_MIRROR_DIR, exist_ok=True)
+
+    num_rows = 0
+    for table in tables:
+        arrow_table = warehouse.read_arrow(f"{PROJECT_ID}.{DATASET_ID}.{table}")
+
+        # BIGNUMERIC arrives as decimal256, which DuckDB can't read -> store as float
+        arrow_table = decimals_to_float(arrow_table)
+
+        # write to a temp file first so readers never see a half-written mirror
+        parquet_file = _parquet_file(table)
+        tmp_parquet = parquet_file + ".tmp"
+        pq.write_table(arrow_table, tmp_parquet)
+        os.replace(tmp_parquet, parquet_file)
+        num_rows += arrow_table.num_rows
+
+    table_ref = f"{PROJECT_ID}.{DATASET_ID}.dashboard_temp"
+    meta = {
+        "table": table_ref,
+        "tables": list(tables),
+        "num_rows": num_rows,
+        "generation": generation,
+        "mirrored_at": time.time(),
+    }
+    tmp_meta = META_FILE + ".tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, META_FILE)
+
+    logger.info(f"[LOCAL MIRROR] refreshed tables={list(tables)} rows={num_rows}")
+    return num_rows
+
+
+def _connect():
+    import duckdb
+
+    meta = _read_meta() or {}
+    con = duckdb.connect()
+    for table in meta.get("tables", ["dashboard_temp"]):
+        parquet_path = _parquet_file(table).replace("'", "''")
+        con.execute(
+            f'CREATE VIEW "{table}" AS SELECT * FROM read_parquet(\'{parquet_path}\')'
+        )
+    return con
+
+
+def query_arrow(sql: str, params: dict = None):
+    """
+    Run DuckDB SQL against the mirrored dashboard_temp and return a
+    pyarrow.Table.
+    """
+    con = _connect()
+    try:
+        return con.execute(sql, params or {}).fetch_arrow_table()
+    finally:
+        con.close()
+
+
+def stream_arrow(sql: str, params: dict = None, batch_rows: int = 10000):
+    """
+    Same as query_arrow(), but returns an iterator of pyarrow.RecordBatch.
+    """
+    con = _connect()
+    try:
+        reader = con.execute(sql, params or {}).fetch_record_batch(batch_rows)
+    except Exception:
+        con.close()
+        raise
+
+    def batches():
+        try:
+            yield from reader
+        finally:
+            con.close()
+
+    return batches()
@@ -0,0 +1,383 @@
+# backend/nl_cache.py
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv
+from sqlglot.dialects.bigquery import BigQuery
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+# Question -> generated SQL, so rephrasings of common questions skip the
+# Gemini round trip. Persisted to a JSON file and shared across restarts.
+NL_CACHE_FILE = os.getenv("NL_CACHE_FILE", "nl_cache.json")
+NL_CACHE_MAX_ENTRIES = int(os.getenv("NL_CACHE_MAX_ENTRIES", "2000"))
+# TF-IDF cosine similarity a different wording needs to reuse an entry
+NL_CACHE_SIMILARITY = float(os.getenv("NL_CACHE_SIMILARITY", "0.8"))
+# new entries are written out by a background timer this long after the
+# first unsaved one (and on shutdown), not on every miss
+NL_CACHE_SAVE_DELAY_SECONDS = float(os.getenv("NL_CACHE_SAVE_DELAY_SECONDS", "5"))
+
+# words that don't change what's being asked; negations, comparatives and
+# time words ("not", "most", "last", ...) are deliberately kept
+_STOP_WORDS = frozenset(
+    """
+    a an the please show me give tell list display find get return what which
+    who is are was were be been has have had do does did can could would will
+    should i we you my our your us it its this that these those there here of
+    for to in on at by with from about as and or all any some
+    """.split()
+)
+# applied after stemming ("classes" -> "classe")
+_SYNONYMS = {"each": "per", "every": "per", "class": "course", "classe": "course"}
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_SLOT = "#"
+
+
+def normalize(question: str):
+    """
+    (key, numbers): the question lower-cased, stripped of punctuation and
+    stop words, lightly stemmed, with every number replaced by a "#" slot.
+    "Show me the TOP 5 courses!" -> ("top # course", ["5"]).
+    """
+    numbers = _NUMBER.findall(question)
+    text = _NUMBER.sub(f" {_SLOT} ", question.lower())
+    text = re.sub(r"'s\b", "", text)
+    text = re.sub(r"[^a-z0-9#]+", " ", text)
+
+    words = []
+    for word in text.split():
+        if word in _STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(_SYNONYMS.get(word, word))
+    return " ".join(words), numbers
+
+
+def _features(key: str) -> Counter:
+    words = key.split()
+    features = Counter(w for w in words if w != _SLOT)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return features
+
+
+def _number_offsets(sql: str, numbers: list) -> list:
+    """
+    For each number from the question, the (start, end) offsets of the SQL
+    literal it became (e.g. "top 5" -> LIMIT 5), or None when it can't be
+    told apart (missing, repeated, or shared with another slot). Slots with
+    offsets are re-filled on a hit; the rest must match exactly.
+    """
+    try:
+        tokens = BigQuery().tokenize(sql)
+    except TokenError:
+        return [None] * len(numbers)
+
+    positions = {}
+    for token in tokens:
+        if token.token_type == TokenType.NUMBER:
+            positions.setdefault(token.text, []).append((token.start, token.end + 1))
+
+    counts = Counter(numbers)
+    offsets = []
+    for value in numbers:
+        found = positions.get(value, [])
+        offsets.append(found[0] if counts[value] == 1 and len(found) == 1 else None)
+    return offsets
+
+
+def _fill(entry: dict, numbers: list):
+    """
+    The entry's SQL with its numbers replaced by `numbers`, or None if a
+    slot that isn't in the SQL differs (the cached SQL would be wrong).
+    """
+    if len(numbers) != len(entry["numbers"]):
+        return None
+
+    edits = []
+    for old, new, offset in zip(entry["numbers"], numbers, entry["offsets"]):
+        if old == new:
+            continue
+        if offset is None:
+            return None
+        edits.append((offset, new))
+
+    sql = entry["sql"]
+    for (start, end), new in sorted(edits, reverse=True):
+        sql = sql[:start] + new + sql[end:]
+    return sql
+
+
+class NLCache:
+    """
+    LRU of question -> SQL, bounded by entry count.
+
+    Lookups try the normalized question first, then the most similar
+    question in the same scope (TF-IDF over words + bigrams) above
+    NL_CACHE_SIMILARITY. Entries are tied to a schema fingerprint: when
+    the schema shown to the model changes, everything is dropped.
+
+    Saving happens off the request path: put() only marks the cache dirty
+    and a timer thread calls flush() `save_delay` seconds later. flush()
+    merges in entries other workers saved to the same file first, so they
+    don't simply overwrite each other; two flushes racing can still drop
+    the other's newest entries until that worker saves again.
+    """
+
+    def __init__(
+        self,
+        path: str = NL_CACHE_FILE,
+        max_entries: int = NL_CACHE_MAX_ENTRIES,
+        similarity: float = NL_CACHE_SIMILARITY,
+        save_delay: float = NL_CACHE_SAVE_DELAY_SECONDS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.save_delay = save_delay
+        self._entries = OrderedDict()
+        self._index = {}  # feature -> set of entry ids
+        self._schema = None
+        self._loaded = False
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer of self.path at a time
+        self.saves = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def fingerprint(schema: str) -> str:
+        return hashlib.sha1(schema.encode()).hexdigest()[:16]
+
+    # --------- persistence ---------
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self) -> None:
+        self._loaded = True
+        state = self._read()
+        if state is None:
+            return
+        self._schema = state.get("schema")
+        for entry in state.get("entries", []):
+            self._add(entry)
+
+    def _merge(self, state) -> None:
+        """
+        Take in entries another worker saved (same schema) that this one
+        doesn't have, as older than its own.
+        """
+        if not state or state.get("schema") != self._schema:
+            return
+        others = [
+            e for e in state.get("entries", []) if self._id(e["scope"], e["key"]) not in self._entries
+        ]
+        if not others:
+            return
+        mine = list(self._entries.values())
+        self._entries.clear()
+        self._index.clear()
+        for entry in others + mine:
+            self._add(entry)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _schedule_save(self) -> None:
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Write unsaved entries to disk now. Runs on the save timer's thread,
+        and at shutdown; the file is read and written outside the cache lock.
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+            on_disk = self._read()
+
+            with self._lock:
+                self._merge(on_disk)
+                state = {"schema": self._schema, "entries": list(self._entries.values())}
+
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+                self.saves += 1
+            except OSError:
+                logger.exception(f"[NL CACHE] could not save {self.path}")
+                with self._lock:
+                    self._dirty = True  # retried on the next put() or at shutdown
+
+    # --------- entries / index ---------
+    @staticmethod
+    def _id(scope: str, key: str) -> str:
+        return f"{scope}\x00{key}"
+
+    def _add(self, entry: dict) -> None:
+        entry_id = self._id(entry["scope"], entry["key"])
+        if entry_id in self._entries:
+            self._remove(entry_id)
+        self._entries[entry_id] = entry
+        for feature in _features(entry["key"]):
+            self._index.setdefault(feature, set()).add(entry_id)
+
+    def _remove(self, entry_id: str) -> None:
+        entry = self._entries.pop(entry_id)
+        for feature in _features(entry["key"]):
+            ids = self._index.get(feature)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[feature]
+
+    def _check_schema(self, schema: str) -> None:
+        if not self._loaded:
+            self._load()
+        fingerprint = self.fingerprint(schema)
+        if fingerprint != self._schema:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._index.clear()
+            self._schema = fingerprint
+
+    def _tfidf(self, features: Counter) -> dict:
+        n = len(self._entries)
+        return {
+            f: count * (math.log((n + 1) / (len(self._index.get(f, ())) + 1)) + 1.0)
+            for f, count in features.items()
+        }
+
+    def _most_similar(self, scope: str, key: str, slots: int):
+        query = self._tfidf(_features(key))
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        if not query_norm:
+            return None, 0.0
+
+        candidates = set()
+        for feature in query:
+            candidates |= self._index.get(feature, set())
+
+        best, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry["scope"] != scope or len(entry["numbers"]) != slots:
+                continue
+            vector = self._tfidf(_features(entry["key"]))
+            norm = math.sqrt(sum(w * w for w in vector.values()))
+            score = sum(w * vector.get(f, 0.0) for f, w in query.items()) / (query_norm * norm)
+            if score > best_score:
+                best, best_score = entry_id, score
+        return best, best_score
+
+    # --------- public API ---------
+    def get(self, question: str, scope: str, schema: str):
+        """
+        Cached SQL for `question`, or None. Returns
+        {"sql", "match": "exact" | "fuzzy", "similarity", "question"}.
+        `scope` separates prompts that would give different SQL (app,
+        max_rows); `schema` is the schema text shown to the model.
+        """
+        key, numbers = normalize(question)
+        with self._lock:
+            self._check_schema(schema)
+
+            entry_id, match, score = self._id(scope, key), "exact", 1.0
+            if entry_id not in self._entries:
+                entry_id, score = self._most_similar(scope, key, len(numbers))
+                match = "fuzzy"
+            if entry_id is None or score < self.similarity:
+                self.misses += 1
+                return None
+
+            entry = self._entries[entry_id]
+            sql = _fill(entry, numbers)
+            if sql is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.fuzzy_hits += 1
+            return {
+                "sql": sql,
+                "match": match,
+                "similarity": round(score, 4),
+                "question": entry["question"],
+            }
+
+    def put(self, question: str, scope: str, schema: str, sql: str) -> None:
+        """
+        Remember validated SQL for `question`; saved to disk shortly after.
+        """
+        key, numbers = normalize(question)
+        with self._lock:
+            self._check_schema(schema)
+            self._add(
+                {
+                    "scope": scope,
+                    "key": key,
+                    "question": question,
+                    "sql": sql,
+                    "numbers": numbers,
+                    "offsets": _number_offsets(sql, numbers),
+                    "created_at": time.time(),
+                }
+            )
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._schedule_save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.fuzzy_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "saves": self.saves,
+                "unsaved": self._dirty,
+                "hit_rate": ((self.exact_hits + self.fuzzy_hits) / lookups) if lookups else 0.0,
+            }
+
+
+nl_cache = NLCache()
@@ -1,57 +1,390 @@
 # backend/nl_to_sql.py
-from typing import Tuple
+import os
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from backend.query_builder import today_utc
+from backend.sql_guard import QUERY_MAX_LOOKBACK_DAYS, QUERY_MAX_ROWS
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
 
 SUPPORTED_APP = "classroom"
 
-def nl_to_sql(app: str, question: str) -> Tuple[str, dict]:
+# Common question shapes are answered from local templates with bound
+# parameters; Gemini is only asked when no template explains (nearly) every
+# word of the question. Confidence = share of content words a template used.
+TEMPLATE_MIN_CONFIDENCE = float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "0.8"))
+
+# default windows when the question doesn't name one
+DEFAULT_RANKING_DAYS = 365
+DEFAULT_TREND_DAYS = 30
+DEFAULT_TOP_N = 10
+
+TABLE = f"`{PROJECT_ID}.{DATASET_ID}.dashboard_temp`"
+
+stats = {"lookups": 0, "hits": 0, "by_intent": {}}
+
+
+# --------- vocabulary ---------
+_FILLER = frozenset(
     """
-    TEMP STUB for Week 3:
-    - Given app + NL question, return (sql_string, params_dict)
-    - Later you will replace the body with a Gemini call.
+    a an the please show me give tell list display find get return what which
+    is are was were be been has have had do does did can could would will i we
+    you my our your us it its this that these those there here of for to in on
+    at with from about as and or all any some their them they how many much
+    """.split()
+)
+
+# (pattern, column alias, aggregate over a course / day); longest first
+_METRICS = [
+    (r"turn(?:ed)?[- ]?ins?(?: submissions?)?", "turned_in_submissions", "SUM(turned_in_submissions)"),
+    (r"returned(?: submissions?)?", "returned_submissions", "SUM(returned_submissions)"),
+    (r"late(?: submissions?)?", "late_submissions", "SUM(late_submissions)"),
+    (r"(?:max|maximum) grades?", "max_grade", "MAX(max_grade)"),
+    (
+        r"(?:(?:average|avg|mean) )?grades?",
+        "avg_grade",
+        # daily averages weighted by that day's submissions
+        "SAFE_DIVIDE(SUM(avg_grade * total_submissions), "
+        "SUM(IF(avg_grade IS NULL, 0, total_submissions)))",
+    ),
+    (r"students?|enrollments?|enrolled", "total_students", "MAX(total_students)"),
+    (r"submissions?|activity|active", "total_submissions", "SUM(total_submissions)"),
+]
+
+_DESC = r"top|most|highest|largest|biggest|best|max"
+_ASC = r"bottom|least|fewest|lowest|smallest|worst|min"
+_COURSE_WORDS = r"courses?|class(?:es)?|sections?"
+_TREND = r"trends?|over time|daily|per day|by day|each day|timeline|history|weekly|per week|by week|monthly|per month|by month"
+_TEACHER = r"teach(?:es|ing)?|taught|teachers?|instructors?|owners?"
+_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+_ISO_DATE = r"\d{4}-\d{2}-\d{2}"
+
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+class _Question:
+    """
+    Lower-cased question plus the character spans templates have explained,
+    so confidence can be computed from what's left over.
+    """
+
+    def __init__(self, text: str):
+        self.original = text.strip().rstrip("?.!")
+        self.text = self.original.lower()
+        self.spans = []
+
+    def take(self, pattern: str):
+        m = re.search(rf"\b(?:{pattern})\b", self.text)
+        if m:
+            self.spans.append(m.span())
+        return m
+
+    def take_all(self, pattern: str) -> list:
+        found = list(re.finditer(rf"\b(?:{pattern})\b", self.text))
+        self.spans.extend(m.span() for m in found)
+        return found
+
+    def confidence(self) -> float:
+        words = [
+            m for m in re.finditer(r"[\w@.+'-]+", self.text) if m.group().strip(".'-") not in _FILLER
+        ]
+        if not words:
+            return 0.0
+        covered = sum(
+            1 for m in words if any(start <= m.start() and m.end() <= end for start, end in self.spans)
+        )
+        return covered / len(words)
+
+
+# --------- entity extraction ---------
+def _date_range(q: _Question, as_of: date, default_days: int):
+    """
+    (start, end) for the question's time phrase, or the last `default_days`.
+    Raises ValueError for dates that don't exist ("2024-02-30").
+    """
+    m = q.take(rf"(?:between|from) ({_ISO_DATE}) (?:and|to|until|through) ({_ISO_DATE})")
+    if m:
+        return date.fromisoformat(m.group(1)), date.fromisoformat(m.group(2))
+
+    m = q.take(rf"(?:since|after) ({_ISO_DATE})")
+    if m:
+        return date.fromisoformat(m.group(1)), as_of
+
+    m = q.take(rf"on ({_ISO_DATE})")
+    if m:
+        day = date.fromisoformat(m.group(1))
+        return day, day
+
+    m = q.take(r"(?:(?:in|over|during|for) )?(?:the )?(?:last|past|previous) (\d+) (day|week|month|year)s?")
+    if m:
+        days = int(m.group(1)) * _UNIT_DAYS[m.group(2)]
+        return as_of - timedelta(days=days), as_of
+
+    m = q.take(r"(?:(?:in|over|during|for) )?(?:the )?(?:last|past|previous) (day|week|month|year)")
+    if m:
+        return as_of - timedelta(days=_UNIT_DAYS[m.group(1)]), as_of
+
+    m = q.take(r"this (week|month|year)")
+    if m:
+        unit = m.group(1)
+        if unit == "week":
+            return as_of - timedelta(days=as_of.weekday()), as_of
+        if unit == "month":
+            return as_of.replace(day=1), as_of
+        return as_of.replace(month=1, day=1), as_of
+
+    if q.take("today"):
+        return as_of, as_of
+    if q.take("yesterday"):
+        return as_of - timedelta(days=1), as_of - timedelta(days=1)
+
+    return as_of - timedelta(days=default_days), as_of
+
+
+def _metric(q: _Question):
+    for pattern, alias, expr in _METRICS:
+        if q.take(pattern):
+            return alias, expr
+    return None
+
+
+_COURSE_NAME = re.compile(
+    r"(?:for|of|in|teaches|teaching) (?:the )?(?:course |class )?(.+?)"
+    r"(?= over | during | between | from | since | after | on \d| in the | last | past | previous | this |$)"
+)
+_METRIC_WORDS = "|".join(pattern for pattern, _, _ in _METRICS)
+
+
+def _course(q: _Question) -> Optional[str]:
+    """
+    Course id ("course 12345") or name (quoted, or after "for" / "of" / "in").
+    Only text no other extractor has taken counts, so call it after the
+    metric and date range. Raises ValueError when the name would swallow
+    metric or course words ("of late submissions for Algebra" with the
+    metric unrecognized): better asked of the model than guessed.
+    """
+    m = re.search(r"[\"“']([^\"”']+)[\"”']", q.original)
+    if m:
+        q.spans.append(m.span())
+        return m.group(1)
+
+    m = q.take(r"course (?:id )?(\d+)")
+    if m:
+        return m.group(1)
+
+    # every "for / of / in ...", not just the first: in "trend of late
+    # submissions for Algebra" the name is after the second one
+    for start in re.finditer(r"\b(?:for|of|in|teaches|teaching) ", q.text):
+        m = _COURSE_NAME.match(q.text, start.start())
+        if m is None or any(s < m.end(1) and m.start(1) < e for s, e in q.spans):
+            continue
+        name = m.group(1)
+        if re.fullmatch(rf"(?:{_COURSE_WORDS}|each.*|every.*|all.*|\d+ .*)", name):
+            continue
+        if re.search(rf"\b(?:{_METRIC_WORDS}|{_COURSE_WORDS})\b", name):
+            raise ValueError(f"Ambiguous course name: {name!r}")
+        q.spans.append(m.span())
+        return q.original[m.start(1):m.end(1)]
+    return None
+
+
+# --------- templates ---------
+def _match_teacher(q: _Question, max_rows: int, as_of: date):
+    if not q.take(_TEACHER):
+        return None
+    q.take(_COURSE_WORDS)
+    q.take(r"who|by")
+    start, end = _date_range(q, as_of, DEFAULT_RANKING_DAYS)
+    params = {"start_date": start, "end_date": end, "limit": max_rows}
+
+    m = q.take(_EMAIL)
+    if m:
+        params["teacher_email"] = m.group()
+        sql = f"""
+SELECT
+  course_id,
+  ANY_VALUE(course_name) AS course_name,
+  ANY_VALUE(section) AS section,
+  MAX(total_students) AS total_students
+FROM {TABLE}
+WHERE app = @app
+  AND LOWER(primary_teacher_email) = LOWER(@teacher_email)
+  AND metric_date BETWEEN @start_date AND @end_date
+GROUP BY course_id
+ORDER BY course_name
+LIMIT @limit
+"""
+        return "teacher_courses", sql, params
+
+    course = _course(q)
+    if course is None:
+        return None
+    params["course"] = course
+    sql = f"""
+SELECT
+  course_id,
+  ANY_VALUE(course_name) AS course_name,
+  ANY_VALUE(section) AS section,
+  ANY_VALUE(primary_teacher_email) AS primary_teacher_email
+FROM {TABLE}
+WHERE app = @app
+  AND (course_id = @course OR LOWER(course_name) = LOWER(@course))
+  AND metric_date BETWEEN @start_date AND @end_date
+GROUP BY course_id
+ORDER BY course_name
+LIMIT @limit
+"""
+    return "course_teacher", sql, params
+
+
+def _match_trend(q: _Question, max_rows: int, as_of: date):
+    found = q.take_all(_TREND)
+    if not found:
+        return None
+    trigger = " ".join(m.group() for m in found)
+    if "week" in trigger:
+        bucket = "CAST(DATE_TRUNC(metric_date, WEEK(MONDAY)) AS DATE)"
+    elif "month" in trigger:
+        bucket = "CAST(DATE_TRUNC(metric_date, MONTH) AS DATE)"
+    else:
+        bucket = "metric_date"
+
+    alias, expr = _metric(q) or ("total_submissions", "SUM(total_submissions)")
+    start, end = _date_range(q, as_of, DEFAULT_TREND_DAYS)
+    params = {"start_date": start, "end_date": end, "limit": max_rows}
+
+    course_filter = ""
+    course = _course(q)
+    if course is not None:
+        params["course"] = course
+        course_filter = "\n  AND (course_id = @course OR LOWER(course_name) = LOWER(@course))"
+    q.take(_COURSE_WORDS)
+    q.take(r"per|by|each|every")
+
+    sql = f"""
+SELECT
+  {bucket} AS metric_date,
+  {expr} AS {alias}
+FROM {TABLE}
+WHERE app = @app
+  AND metric_date BETWEEN @start_date AND @end_date{course_filter}
+GROUP BY 1
+ORDER BY 1
+LIMIT @limit
+"""
+    return "course_trend", sql, params
+
+
+def _match_ranking(q: _Question, max_rows: int, as_of: date):
+    if not q.take(_COURSE_WORDS):
+        return None
+    metric = _metric(q)
+    if metric is None:
+        return None
+    alias, expr = metric
+
+    limit, direction = DEFAULT_TOP_N, "DESC"
+    found = q.take_all(rf"({_DESC}|{_ASC})(?: (\d+))?")
+    if found:
+        # "top 5 ... most late": the first word sets the order
+        direction = "ASC" if re.fullmatch(_ASC, found[0].group(1)) else "DESC"
+        for m in found:
+            if m.group(2):
+                limit = int(m.group(2))
+    q.take(r"by|per|ranked|ranking|rank|order(?:ed)? by|sorted by")
+
+    start, end = _date_range(q, as_of, DEFAULT_RANKING_DAYS)
+    params = {"start_date": start, "end_date": end, "limit": min(limit, max_rows)}
+
+    sql = f"""
+SELECT
+  course_id,
+  ANY_VALUE(course_name) AS course_name,
+  {expr} AS {alias}
+FROM {TABLE}
+WHERE app = @app
+  AND metric_date BETWEEN @start_date AND @end_date
+GROUP BY course_id
+ORDER BY {alias} {direction} NULLS LAST
+LIMIT @limit
+"""
+    return "top_courses_by_metric", sql, params
+
+
+_TEMPLATES = (_match_teacher, _match_trend, _match_ranking)
+
+
+def _bounded(params: dict, as_of: date) -> dict:
+    """
+    Template parameters within what a template may answer: at most
+    QUERY_MAX_ROWS rows (the LIMIT is clamped, as sql_guard does), and a
+    date range inside the last QUERY_MAX_LOOKBACK_DAYS up to `as_of`.
+    A range outside that raises ValueError instead of being narrowed:
+    answering a different window than the one asked for, at full
+    confidence, is worse than asking the model.
+    """
+    earliest = as_of - timedelta(days=QUERY_MAX_LOOKBACK_DAYS)
+    if not earliest <= params["start_date"] <= params["end_date"] <= as_of:
+        raise ValueError(
+            f"{params['start_date']}..{params['end_date']} is outside {earliest}..{as_of}"
+        )
+    return {**params, "limit": max(min(params["limit"], QUERY_MAX_ROWS), 1)}
+
+
+def nl_to_sql(app: str, question: str, max_rows: int = 100, as_of: date = None) -> Optional[dict]:
+    """
+    Answer `question` from a local template, or None if none matches with
+    at least TEMPLATE_MIN_CONFIDENCE. Returns
+    {"intent", "confidence", "sql", "params"} with BigQuery SQL that only
+    uses bound parameters (@app, @start_date, @end_date, @limit, ...).
     """
     if app != SUPPORTED_APP:
         raise ValueError(f"Unsupported app for NL -> SQL: {app}")
 
-    q_lower = question.lower().strip()
-
-    # Very dumb router just so you can test end-to-end
-    if "late" in q_lower and "submissions" in q_lower:
-        sql = """
-        SELECT
-          course_id,
-          course_name,
-          metric_date,
-          late_submissions,
-          total_submissions
-        FROM `{project}.{dataset}.dashboard_temp`
-        WHERE app = @app
-        ORDER BY late_submissions DESC
-        LIMIT @limit
-        """
-        return sql, {}
-
-    if "most active" in q_lower and "course" in q_lower:
-        sql = """
-        SELECT
-          course_id,
-          course_name,
-          total_submissions
-        FROM `{project}.{dataset}.dashboard_temp`
-        WHERE app = @app
-        ORDER BY total_submissions DESC
-        LIMIT @limit
-        """
-        return sql, {}
-
-    # default: just give top courses by submissions
-    sql = """
-    SELECT
-      course_id,
-      course_name,
-      total_submissions
-    FROM `{project}.{dataset}.dashboard_temp`
-    WHERE app = @app
-    ORDER BY total_submissions DESC
-    LIMIT @limit
-    """
-    return sql, {}
+    stats["lookups"] += 1
+    as_of = as_of or today_utc()
+
+    best = None
+    for template in _TEMPLATES:
+        q = _Question(question)
+        try:
+            matched = template(q, max_rows, as_of)
+            if matched is not None:
+                intent, sql, params = matched
+                params = _bounded({"app": app, **params}, as_of)
+        except ValueError:
+            # e.g. an impossible or out-of-window date, an ambiguous course
+            # name: not a question this template can answer
+            matched = None
+        if matched is None:
+            continue
+        confidence = q.confidence()
+        if best is None or confidence > best["confidence"]:
+            best = {
+                "intent": intent,
+                "confidence": round(confidence, 3),
+                "sql": sql,
+                "params": params,
+            }
+
+    if best is None or best["confidence"] < TEMPLATE_MIN_CONFIDENCE:
+        return None
+
+    stats["hits"] += 1
+    stats["by_intent"][best["intent"]] = stats["by_intent"].get(best["intent"], 0) + 1
+    return best
+
+
+def template_stats() -> dict:
+    lookups = stats["lookups"]
+    return {
+        **stats,
+        "hit_rate": (stats["hits"] / lookups) if lookups else 0.0,
+    }
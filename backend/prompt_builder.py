@@ -0,0 +1,207 @@
+# backend/prompt_builder.py
+import asyncio
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from backend import refresh_state
+from backend.nl_cache import normalize
+from backend.warehouse import get_warehouse
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.dashboard_temp"
+
+# few-shot examples per prompt, picked by word overlap with the question;
+# one example adds well over half the bare prompt's length, so only a close
+# match is worth sending
+PROMPT_MAX_EXAMPLES = int(os.getenv("PROMPT_MAX_EXAMPLES", "1"))
+PROMPT_MIN_EXAMPLE_OVERLAP = 0.5
+
+# used until the table can be described (e.g. before the first refresh)
+FALLBACK_SCHEMA = [
+    ("app", "STRING"),
+    ("metric_date", "DATE"),
+    ("course_id", "STRING"),
+    ("course_name", "STRING"),
+    ("section", "STRING"),
+    ("primary_teacher_email", "STRING"),
+    ("total_students", "INT64"),
+    ("total_submissions", "INT64"),
+    ("turned_in_submissions", "INT64"),
+    ("returned_submissions", "INT64"),
+    ("late_submissions", "INT64"),
+    ("avg_grade", "BIGNUMERIC"),
+    ("max_grade", "FLOAT64"),
+    ("ingestion_time", "TIMESTAMP"),
+]
+
+# bookkeeping columns no question needs
+HIDDEN_COLUMNS = {"ingestion_time"}
+
+# one row = one course on one day; only a column that's easy to misuse gets a note
+COLUMN_NOTES = {
+    "avg_grade": "daily mean",
+}
+
+# one-line SQL: the model copies the shape, not the layout. The app filter
+# is left to the rules line (and sql_guard), not repeated in every example.
+EXAMPLES = [
+    (
+        "Courses with no submissions in the last 7 days",
+        f"SELECT course_id, ANY_VALUE(course_name) AS course_name FROM `{TABLE_ID}` "
+        "WHERE metric_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY) "
+        "GROUP BY course_id HAVING SUM(total_submissions) = 0",
+    ),
+    (
+        "Late share per teacher this month",
+        "SELECT primary_teacher_email, SAFE_DIVIDE(SUM(late_submissions), SUM(total_submissions)) AS late_rate "
+        f"FROM `{TABLE_ID}` WHERE metric_date >= DATE_TRUNC(CURRENT_DATE(), MONTH) "
+        "GROUP BY 1 ORDER BY 2 DESC",
+    ),
+    (
+        "Average grade per section",
+        "SELECT section, SAFE_DIVIDE(SUM(avg_grade * total_submissions), "
+        f"SUM(IF(avg_grade IS NULL, 0, total_submissions))) AS grade FROM `{TABLE_ID}` "
+        "WHERE metric_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 90 DAY) "
+        "GROUP BY 1 ORDER BY 2 DESC",
+    ),
+    (
+        "Students enrolled across all courses",
+        "SELECT SUM(n) AS total_students FROM (SELECT MAX(total_students) AS n "
+        f"FROM `{TABLE_ID}` WHERE metric_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY) GROUP BY course_id)",
+    ),
+    (
+        "Submissions by day of week",
+        "SELECT FORMAT_DATE('%A', metric_date) AS weekday, SUM(total_submissions) AS n "
+        f"FROM `{TABLE_ID}` WHERE metric_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 90 DAY) GROUP BY 1 ORDER BY 2 DESC",
+    ),
+]
+
+_EXAMPLE_WORDS = [set(normalize(q)[0].split()) - {"#"} for q, _ in EXAMPLES]
+
+_schema = {"generation": None, "text": None}
+_schema_lock = threading.Lock()
+
+
+# --------- schema ---------
+def _render_schema(columns: list) -> str:
+    """
+    `table`: TYPE a, b, c; TYPE d (note), ... - columns grouped by type in
+    table order, so each type name is spelled out once.
+    """
+    by_type = {}
+    for name, type_ in columns:
+        if name in HIDDEN_COLUMNS:
+            continue
+        note = COLUMN_NOTES.get(name)
+        by_type.setdefault(type_, []).append(name + (f" ({note})" if note else ""))
+    groups = "; ".join(f"{type_} {', '.join(names)}" for type_, names in by_type.items())
+    return f"`{TABLE_ID}`: {groups}"
+
+
+def schema_text() -> str:
+    """
+    dashboard_temp's columns as one compact line, read from table metadata
+    once per refresh generation (a refresh may change the table).
+    """
+    generation = refresh_state.current_generation()
+    with _schema_lock:
+        if _schema["text"] is not None and _schema["generation"] == generation:
+            return _schema["text"]
+
+        try:
+            columns = get_warehouse().table_schema(TABLE_ID)
+        except Exception as e:
+            logger.warning(f"[PROMPT] could not describe {TABLE_ID}, using built-in schema: {e}")
+            columns = FALLBACK_SCHEMA
+
+        _schema["generation"] = generation
+        _schema["text"] = _render_schema(columns)
+        return _schema["text"]
+
+
+async def schema_text_async() -> str:
+    if _schema["text"] is not None and _schema["generation"] == refresh_state.current_generation():
+        return _schema["text"]
+    return await asyncio.to_thread(schema_text)
+
+
+# --------- prompt ---------
+def relevant_examples(question: str, limit: int = PROMPT_MAX_EXAMPLES) -> list:
+    """
+    Up to `limit` (question, sql) examples sharing the most words with
+    `question`; none if nothing overlaps enough to help.
+    """
+    words = set(normalize(question)[0].split()) - {"#"}
+    scored = []
+    for i, example_words in enumerate(_EXAMPLE_WORDS):
+        if example_words:
+            overlap = len(words & example_words) / len(example_words)
+            if overlap >= PROMPT_MIN_EXAMPLE_OVERLAP:
+                scored.append((overlap, i))
+    return [EXAMPLES[i] for _, i in sorted(scored, reverse=True)[:limit]]
+
+
+def _rules(app: str, max_rows: int) -> str:
+    return f"Only this table; WHERE app = '{app}'; bound metric_date; LIMIT {max_rows};"
+
+
+def build_sql_prompt(question: str, app: str, max_rows: int, schema: str) -> str:
+    """
+    Compact NL -> SQL prompt shared by /query/run and /query/nl: one-line
+    schema, the rules sql_guard enforces anyway, and only relevant examples.
+    """
+    lines = [
+        "BigQuery SQL; one row per course per day:",
+        schema,
+        f"{_rules(app, max_rows)} reply with one ```sql``` block.",
+    ]
+
+    examples = relevant_examples(question)
+    for example_question, example_sql in examples:
+        lines.append(f"Q: {example_question}\n```sql\n{example_sql}\n```")
+
+    lines.append(f"Q: {question}")
+    prompt = "\n".join(lines)
+
+    logger.info(f"[PROMPT] chars={len(prompt)} approx_tokens={len(prompt) // 4} examples={len(examples)}")
+    return prompt
+
+
+def build_batch_sql_prompt(questions: list, app: str, max_rows: int, schema: str) -> str:
+    """
+    One prompt for several questions (/query/batch): the schema and rules
+    once, examples relevant to any of the questions, then one numbered
+    question per line. Each answer comes back in its own labelled block.
+    """
+    lines = [
+        "BigQuery SQL per question; one row per course per day:",
+        schema,
+        f"{_rules(app, max_rows)} answer each question, in order, with its own ```sql``` "
+        "block whose first line is the label (-- Q1, -- Q2, ...); nothing else.",
+    ]
+
+    examples = []
+    for question in questions:
+        for example in relevant_examples(question):
+            if example not in examples:
+                examples.append(example)
+    for example_question, example_sql in examples[:PROMPT_MAX_EXAMPLES]:
+        lines.append(f"Example: {example_question}\n```sql\n{example_sql}\n```")
+
+    lines.extend(f"Q{i}: {question}" for i, question in enumerate(questions, 1))
+    prompt = "\n".join(lines)
+
+    logger.info(
+        f"[PROMPT] batch questions={len(questions)} chars={len(prompt)} "
+        f"approx_tokens={len(prompt) // 4} examples={min(len(examples), PROMPT_MAX_EXAMPLES)}"
+    )
+    return prompt
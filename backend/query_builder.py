@@ -0,0 +1,85 @@
+# backend/query_builder.py
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+from sqlglot.dialects.bigquery import BigQuery
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+# BigQuery only serves a query from its (free, 24h) results cache when the
+# text and parameters repeat exactly and the query has no nondeterministic
+# functions. Route SQL is written with @as_of / @as_of_ts parameters;
+# generated SQL is rewritten here to use them.
+AS_OF_PARAM = "as_of"
+AS_OF_TS_PARAM = "as_of_ts"
+
+
+def today_utc() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def as_of_params(as_of: date = None) -> dict:
+    """
+    Bound values for @as_of (DATE) and @as_of_ts (TIMESTAMP, start of that
+    day in UTC). Defaults to today, so the values change once a day.
+    """
+    as_of = as_of or today_utc()
+    return {
+        AS_OF_PARAM: as_of,
+        AS_OF_TS_PARAM: datetime(as_of.year, as_of.month, as_of.day, tzinfo=timezone.utc),
+    }
+
+
+_REPLACEMENTS = {
+    TokenType.CURRENT_DATE: AS_OF_PARAM,
+    TokenType.CURRENT_TIMESTAMP: AS_OF_TS_PARAM,
+}
+
+
+@lru_cache(maxsize=256)
+def _bind(sql: str) -> tuple:
+    try:
+        tokens = BigQuery().tokenize(sql)
+    except TokenError:
+        return sql, ()
+
+    # splice by token offsets so the rest of the text stays byte-identical
+    # (re-generating the SQL would reformat it)
+    out, used, pos, i = [], set(), 0, 0
+    while i < len(tokens):
+        token = tokens[i]
+        name = _REPLACEMENTS.get(token.token_type)
+        if name is None or (i and tokens[i - 1].token_type == TokenType.DOT):
+            i += 1
+            continue
+
+        end = token.end
+        if i + 1 < len(tokens) and tokens[i + 1].token_type == TokenType.L_PAREN:
+            # CURRENT_DATE('tz') means a different day: leave it alone
+            if i + 2 >= len(tokens) or tokens[i + 2].token_type != TokenType.R_PAREN:
+                i += 1
+                continue
+            end = tokens[i + 2].end
+            i += 2
+
+        out.append(sql[pos:token.start])
+        out.append(f"@{name}")
+        pos = end + 1
+        used.add(name)
+        i += 1
+
+    if not used:
+        return sql, ()
+    out.append(sql[pos:])
+    return "".join(out), tuple(sorted(used))
+
+
+def bind_nondeterministic(sql: str, as_of: date = None):
+    """
+    Replace CURRENT_DATE() / CURRENT_TIMESTAMP() in BigQuery SQL with @as_of /
+    @as_of_ts. Returns (sql, params) with only the parameters that are used.
+    SQL that doesn't tokenize is returned unchanged.
+    """
+    sql, used = _bind(sql)
+    values = as_of_params(as_of)
+    return sql, {name: values[name] for name in used}
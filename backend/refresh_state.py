@@ -0,0 +1,58 @@
+# backend/refresh_state.py
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared by every worker process: bumped once per dashboard_refresh.run
+REFRESH_STATE_FILE = os.getenv("REFRESH_STATE_FILE", "refresh_state.json")
+
+_lock = threading.Lock()
+_cached = {"mtime_ns": None, "state": {"generation": 0, "refreshed_at": None}}
+
+
+def current() -> dict:
+    """
+    Current refresh state: {"generation": int, "refreshed_at": epoch seconds or None}.
+    Re-reads the state file only when its mtime changes.
+    """
+    try:
+        mtime_ns = os.stat(REFRESH_STATE_FILE).st_mtime_ns
+    except OSError:
+        return {"generation": 0, "refreshed_at": None}
+
+    if mtime_ns != _cached["mtime_ns"]:
+        try:
+            with open(REFRESH_STATE_FILE) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return _cached["state"]
+        _cached["mtime_ns"] = mtime_ns
+        _cached["state"] = state
+    return _cached["state"]
+
+
+def current_generation() -> int:
+    return current()["generation"]
+
+
+def bump(refreshed_at: float = None) -> int:
+    """
+    Mark dashboard_temp as changed. Called by dashboard_refresh.run after the rebuild
+    with the rebuild's ingestion_time (epoch seconds; defaults to now).
+    Returns the new generation.
+    """
+    with _lock:
+        state = {
+            "generation": current_generation() + 1,
+            "refreshed_at": refreshed_at if refreshed_at is not None else time.time(),
+        }
+        tmp = REFRESH_STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, REFRESH_STATE_FILE)
+    return state["generation"]
@@ -0,0 +1,104 @@
+# backend/result_cache.py
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from backend import refresh_state
+
+load_dotenv()
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ResultCache:
+    """
+    In-process LRU of encoded analytics responses, bounded by total bytes.
+
+    Entries belong to one refresh generation: when dashboard_refresh.run
+    bumps the generation, the whole cache is dropped on the next access.
+    A result is only stored if the generation it was built under is still
+    current (a build that straddled a refresh may have read old data).
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_puts = 0
+
+    @staticmethod
+    def _key(endpoint: str, params: dict) -> tuple:
+        return endpoint, json.dumps(params or {}, sort_keys=True, default=str)
+
+    def _check_generation(self) -> None:
+        generation = refresh_state.current_generation()
+        if generation != self._generation:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def get(self, endpoint: str, params: dict = None):
+        key = self._key(endpoint, params)
+        with self._lock:
+            self._check_generation()
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, endpoint: str, params: dict, value: bytes, generation: int) -> bool:
+        """
+        Store `value`, built from the data of refresh `generation` (read
+        before the build started). Returns False if it wasn't stored.
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return False
+
+        key = self._key(endpoint, params)
+        with self._lock:
+            self._check_generation()
+            if generation != self._generation:
+                self.stale_puts += 1
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+
+            self._entries[key] = value
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "generation": self._generation,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale_puts": self.stale_puts,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+result_cache = ResultCache()
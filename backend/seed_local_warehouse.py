@@ -0,0 +1,118 @@
+# backend/seed_local_warehouse.py
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from backend import dashboard_refresh
+from backend.ingest_enrollments import ENROLLMENTS_SCHEMA
+from backend.ingest_submissions import SUBMISSIONS_SCHEMA
+from backend.warehouse import get_warehouse
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+
+def run(
+    num_courses: int = 300,
+    students_per_course: int = 30,
+    assignments_per_course: int = 40,
+    days: int = 365,
+) -> dict:
+    """
+    Fill the warehouse with synthetic Classroom data at realistic sizes and
+    rebuild dashboard_temp, so the pipeline can be load-tested offline
+    (WAREHOUSE_BACKEND=local). Returns row counts + timings.
+    """
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    ingestion_time = now.isoformat()
+
+    enrollments = []
+    submissions = []
+    for c in range(num_courses):
+        course_id = str(100000 + c)
+        course_name = f"Course {c}"
+        section = f"Section {c % 10}"
+
+        enrollments.append(
+            {
+                "course_id": course_id,
+                "course_name": course_name,
+                "section": section,
+                "course_state": "ACTIVE",
+                "user_id": f"t{c}",
+                "user_email": f"teacher{c}@example.com",
+                "role": "OWNER",
+                "primary_teacher": True,
+                "domain": "example.com",
+                "ingestion_time": ingestion_time,
+            }
+        )
+        for s in range(students_per_course):
+            enrollments.append(
+                {
+                    "course_id": course_id,
+                    "course_name": course_name,
+                    "section": section,
+                    "course_state": "ACTIVE",
+                    "user_id": f"s{c}_{s}",
+                    "user_email": f"student{c}_{s}@example.com",
+                    "role": "STUDENT",
+                    "primary_teacher": False,
+                    "domain": "example.com",
+                    "ingestion_time": ingestion_time,
+                }
+            )
+
+        for a in range(assignments_per_course):
+            assigned = now - timedelta(days=rng.randrange(days))
+            for s in range(students_per_course):
+                state = rng.choice(["TURNED_IN", "RETURNED", "CREATED"])
+                submissions.append(
+                    {
+                        "course_id": course_id,
+                        "course_work_id": f"{course_id}_{a}",
+                        "course_work_title": f"Assignment {a}",
+                        "submission_id": f"{course_id}_{a}_{s}",
+                        "student_id": f"s{c}_{s}",
+                        "state": state,
+                        "assigned_time": assigned.isoformat(),
+                        "due_time": (assigned + timedelta(days=7)).isoformat(),
+                        "late": rng.random() < 0.1,
+                        "grade": float(rng.randint(50, 100)) if state == "RETURNED" else None,
+                        "max_grade": 100.0,
+                        "ingestion_time": ingestion_time,
+                    }
+                )
+
+    warehouse = get_warehouse()
+    timings = {}
+
+    t0 = time.perf_counter()
+    warehouse.load_rows(
+        f"{PROJECT_ID}.{DATASET_ID}.classroom_enrollments", enrollments, ENROLLMENTS_SCHEMA
+    )
+    warehouse.load_rows(
+        f"{PROJECT_ID}.{DATASET_ID}.classroom_submissions", submissions, SUBMISSIONS_SCHEMA
+    )
+    timings["load_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    t0 = time.perf_counter()
+    dashboard_rows = dashboard_refresh.run()
+    timings["refresh_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    return {
+        "enrollments": len(enrollments),
+        "submissions": len(submissions),
+        "dashboard_temp": dashboard_rows,
+        **timings,
+    }
+
+
+if __name__ == "__main__":
+    print(run())
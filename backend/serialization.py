@@ -0,0 +1,147 @@
+# backend/serialization.py
+import io
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import Response
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def decimals_to_float(table):
+    """
+    Cast NUMERIC / BIGNUMERIC (decimal128/256) columns of an Arrow table or
+    RecordBatch to float64, which JSON clients and DuckDB both handle.
+    Whole-number decimals (e.g. DuckDB HUGEINT counts) become int64.
+    """
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            target = pa.int64() if field.type.scale == 0 else pa.float64()
+            table = table.set_column(i, field.name, table.column(i).cast(target))
+    return table
+
+
+def arrow_to_rows(table) -> list:
+    """
+    [{"col": value, ...}, ...] — the default response shape.
+    """
+    return decimals_to_float(table).to_pylist()
+
+
+def arrow_to_columnar(table) -> dict:
+    """
+    {"columns": [names], "values": [[column 0 values], [column 1 values], ...]}
+    Column names are sent once and each column is converted in one pass.
+    """
+    table = decimals_to_float(table)
+    return {
+        "columns": table.column_names,
+        "values": [column.to_pylist() for column in table.columns],
+    }
+
+
+def serialize_table(table, response_format: str = "rows"):
+    if response_format == "columnar":
+        return arrow_to_columnar(table)
+    return arrow_to_rows(table)
+
+
+def split_by_column(table, column: str) -> dict:
+    """
+    {key: table slice for that key} for a table already sorted by `column`.
+    The key column itself is left out of each slice.
+    """
+    keys = table.column(column).to_pylist()
+    table = table.drop_columns([column])
+
+    groups = {}
+    start = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            groups[keys[start]] = table.slice(start, i - start)
+            start = i
+    return groups
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def encode_json(content) -> bytes:
+    """
+    orjson encoding used for every JSON payload (dates / datetimes are
+    written as ISO 8601 natively, no per-cell isoformat()).
+    """
+    return orjson.dumps(content, default=_default)
+
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    """
+    JSONResponse replacement encoded with encode_json().
+    """
+    return Response(
+        content=encode_json(content),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# --------- STREAMING ---------
+def ndjson_chunks(batches):
+    """
+    One JSON object per line, encoded batch by batch.
+    """
+    for batch in batches:
+        rows = decimals_to_float(batch).to_pylist()
+        if rows:
+            yield b"".join(orjson.dumps(r, default=_default) + b"\n" for r in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    File-like object that collects what the Arrow IPC writer produces so it
+    can be handed to the response one batch at a time.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+
+def arrow_ipc_chunks(batches):
+    """
+    Arrow IPC stream format: schema message, then one message per batch.
+    """
+    import pyarrow as pa
+
+    sink = _ChunkSink()
+    writer = None
+    for batch in batches:
+        batch = decimals_to_float(batch)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    if writer is None:
+        # no batches at all: still send a valid (empty) stream
+        writer = pa.ipc.new_stream(sink, pa.schema([]))
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,71 @@
+# backend/single_flight.py
+import asyncio
+import json
+
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight work: while a call for `key` is running,
+    later callers with the same key await that call instead of starting
+    their own (e.g. one BigQuery job for a classroom opening the dashboard
+    at once). Nothing is kept once the call finishes; that's the result
+    cache's job. The call is cancelled once every caller has gone away.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+
+    @staticmethod
+    def key(sql: str, params: dict = None) -> str:
+        return json.dumps([sql, params or {}], sort_keys=True, default=str)
+
+    async def do(self, key: str, fn):
+        """
+        Return `await fn()`, shared with every concurrent caller of `key`.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+
+            def done(t):
+                if self._inflight.get(key) is t:
+                    del self._inflight[key]
+                    self._waiters.pop(key, None)
+                # errors reach every waiter; don't warn if nobody was left
+                if not t.cancelled():
+                    t.exception()
+
+            task.add_done_callback(done)
+        else:
+            self.shared += 1
+
+        # shield: one caller disconnecting must not cancel the others' job,
+        # but the last one leaving cancels it (and with it the warehouse job)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": self.shared,
+            "in_flight": len(self._inflight),
+            "dedupe_rate": (self.shared / self.calls) if self.calls else 0.0,
+        }
+
+
+query_flights = SingleFlight()
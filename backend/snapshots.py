@@ -0,0 +1,263 @@
+# backend/snapshots.py
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+from backend import refresh_state
+from backend.query_builder import today_utc
+from backend.serialization import arrow_to_rows, encode_json, serialize_table, split_by_column
+
+try:
+    import brotli
+except ImportError:  # gzip-only snapshots
+    brotli = None
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+# Post-refresh stage: render the default analytics payloads to disk once per
+# refresh (plain + .gz + .br) so typical dashboard loads are file reads.
+SNAPSHOTS_ENABLED = os.getenv("SNAPSHOTS_ENABLED", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+CURRENT_FILE = os.path.join(SNAPSHOT_DIR, "current.json")
+
+# the routes' default window (CourseTimeseriesRequest.days)
+SNAPSHOT_DAYS = 30
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+# --------- SQL (BigQuery dialect, same shape as the routes) ---------
+COURSES_SQL = f"""
+SELECT
+  course_id,
+  ANY_VALUE(course_name) AS course_name,
+  ANY_VALUE(section) AS section,
+  ANY_VALUE(primary_teacher_email) AS primary_teacher_email
+FROM `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
+WHERE app = 'classroom'
+GROUP BY course_id
+ORDER BY course_name
+"""
+
+LATEST_META_SQL = f"""
+SELECT
+  app,
+  metric_date,
+  course_id,
+  course_name,
+  section,
+  primary_teacher_email,
+  total_students,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade
+FROM `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
+WHERE app = @app
+QUALIFY ROW_NUMBER() OVER (PARTITION BY course_id ORDER BY metric_date DESC) = 1
+"""
+
+TIMESERIES_SQL = f"""
+SELECT
+  course_id,
+  metric_date,
+  total_submissions,
+  turned_in_submissions,
+  returned_submissions,
+  late_submissions,
+  avg_grade,
+  max_grade
+FROM `{PROJECT_ID}.{DATASET_ID}.dashboard_temp`
+WHERE app = @app
+  AND metric_date BETWEEN DATE_SUB(@as_of, INTERVAL @days DAY) AND @as_of
+ORDER BY course_id, metric_date
+"""
+
+
+def snapshot_name(endpoint: str, key: str = None) -> str:
+    """
+    Path of a snapshot inside a generation directory, e.g.
+    "analytics_courses.json" or "analytics_course_detail/<course_id>.json".
+    """
+    if key is None:
+        return f"{endpoint}.json"
+    return f"{endpoint}/{quote(str(key), safe='')}.json"
+
+
+def _write(root: str, name: str, content) -> None:
+    body = encode_json(content)
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "wb") as f:
+        f.write(body)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(body, quality=11))
+
+
+def render(warehouse, generation: int) -> int:
+    """
+    Render the course list, every course's detail and default-window
+    timeseries (and the all-courses batch) for `generation`, then point
+    current.json at them. Called by dashboard_refresh.run after the refresh
+    state is bumped. Returns number of payloads written.
+    """
+    started = time.time()
+    as_of = today_utc()
+    app = "classroom"
+
+    courses = warehouse.query_arrow(COURSES_SQL)
+    metas = {r["course_id"]: r for r in arrow_to_rows(warehouse.query_arrow(LATEST_META_SQL, {"app": app}))}
+    timeseries = split_by_column(
+        warehouse.query_arrow(TIMESERIES_SQL, {"app": app, "days": SNAPSHOT_DAYS, "as_of": as_of}),
+        "course_id",
+    )
+    # every course, [] for those without rows in the window, like the live batch route
+    course_ids = sorted(set(courses.column("course_id").to_pylist()) | set(timeseries))
+    series = {
+        course_id: serialize_table(timeseries[course_id]) if course_id in timeseries else []
+        for course_id in course_ids
+    }
+
+    root = os.path.join(SNAPSHOT_DIR, str(generation))
+    shutil.rmtree(root, ignore_errors=True)
+    common = {"source": "snapshot", "cache_hit": False}
+
+    _write(root, snapshot_name("analytics_courses"), {
+        "status": "ok",
+        "row_count": courses.num_rows,
+        "courses": serialize_table(courses),
+        **common,
+    })
+    _write(root, snapshot_name("analytics_course_timeseries_batch"), {
+        "status": "ok",
+        "app": app,
+        "as_of": as_of,
+        "granularity": "day",
+        "course_count": len(series),
+        "row_count": sum(len(rows) for rows in series.values()),
+        "series": series,
+        **common,
+    })
+    written = 2
+
+    for course_id in courses.column("course_id").to_pylist():
+        data = series.get(course_id, [])
+        _write(root, snapshot_name("analytics_course_timeseries", course_id), {
+            "status": "ok",
+            "app": app,
+            "course_id": course_id,
+            "as_of": as_of,
+            "granularity": "day",
+            "row_count": len(data),
+            "data": data,
+            **common,
+        })
+        _write(root, snapshot_name("analytics_course_detail", course_id), {
+            "status": "ok",
+            "app": app,
+            "course_id": course_id,
+            "as_of": as_of,
+            "granularity": "day",
+            "meta": metas.get(course_id),
+            "timeseries": data,
+            "students": [],
+            **common,
+        })
+        written += 2
+
+    current = {
+        "generation": generation,
+        "as_of": as_of.isoformat(),
+        "rendered_at": time.time(),
+    }
+    tmp = CURRENT_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(current, f)
+    os.replace(tmp, CURRENT_FILE)
+
+    # keep the previous generation for requests still reading it
+    for entry in os.listdir(SNAPSHOT_DIR):
+        if entry.isdigit() and int(entry) < generation - 1:
+            shutil.rmtree(os.path.join(SNAPSHOT_DIR, entry), ignore_errors=True)
+
+    elapsed_ms = (time.time() - started) * 1000.0
+    logger.info(
+        f"[SNAPSHOTS] generation={generation} payloads={written} "
+        f"encodings={list(ENCODINGS)} render_ms={elapsed_ms:.2f}"
+    )
+    return written
+
+
+def current():
+    try:
+        with open(CURRENT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current() -> bool:
+    """
+    True when snapshots exist for the current refresh generation and today's
+    default window. Routes fall back to live queries otherwise.
+    """
+    if not SNAPSHOTS_ENABLED:
+        return False
+    state = current()
+    return (
+        state is not None
+        and state["generation"] == refresh_state.current_generation()
+        and state["as_of"] == today_utc().isoformat()
+    )
+
+
+def _accepted(accept_encoding: str) -> set:
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, q = part.strip().partition(";")
+        if q.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def resolve(name: str, accept_encoding: str = ""):
+    """
+    (file path, content encoding or None) of the best variant of snapshot
+    `name` in the current generation, or None if there is no such snapshot.
+    """
+    state = current()
+    if state is None:
+        return None
+
+    name = os.path.normpath(name)
+    if name.startswith("..") or os.path.isabs(name):
+        return None
+
+    path = os.path.join(SNAPSHOT_DIR, str(state["generation"]), name)
+    if not os.path.isfile(path):
+        return None
+
+    accepted = _accepted(accept_encoding)
+    for encoding in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + _SUFFIXES[encoding]):
+            return path + _SUFFIXES[encoding], encoding
+    return path, None
@@ -0,0 +1,222 @@
+# backend/sql_guard.py
+import os
+from functools import lru_cache
+
+import sqlglot
+from dotenv import load_dotenv
+from sqlglot import exp
+from sqlglot.errors import ParseError, TokenError
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DATASET_ID = os.getenv("DATASET_ID", "workspace_analytics")
+
+# Generated SQL is parsed and rewritten before it runs instead of trusting
+# the prompt's rules: one read-only query, only dashboard tables, always
+# filtered by app and metric_date, and never more than max_rows rows.
+ALLOWED_TABLES = ("dashboard_temp", "dashboard_temp_weekly", "dashboard_temp_monthly")
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+QUERY_MAX_LOOKBACK_DAYS = int(os.getenv("QUERY_MAX_LOOKBACK_DAYS", "365"))
+
+_FORBIDDEN = (
+    exp.Insert,
+    exp.Update,
+    exp.Delete,
+    exp.Merge,
+    exp.Create,
+    exp.Drop,
+    exp.Alter,
+    exp.TruncateTable,
+    exp.Command,
+    exp.Grant,
+    exp.Transaction,
+    exp.Commit,
+    exp.Rollback,
+    exp.Set,
+    exp.Use,
+    exp.Copy,
+    exp.LoadData,
+)
+
+
+class UnsafeQuery(ValueError):
+    pass
+
+
+def _parse(sql: str):
+    try:
+        trees = [t for t in sqlglot.parse(sql, read="bigquery") if t is not None]
+    except (ParseError, TokenError) as e:
+        raise UnsafeQuery(f"Could not parse SQL: {e}") from None
+
+    if len(trees) != 1:
+        raise UnsafeQuery("Exactly one SQL statement is allowed")
+    tree = trees[0]
+    if not isinstance(tree, exp.Query) or tree.find(*_FORBIDDEN):
+        raise UnsafeQuery("Only SELECT queries are allowed")
+    return tree
+
+
+def _base_tables(tree) -> list:
+    """
+    Warehouse tables the query reads (CTE references excluded). Raises
+    UnsafeQuery for anything outside the allow-list.
+    """
+    ctes = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    tables = []
+    for table in tree.find_all(exp.Table):
+        if not table.db and table.name in ctes:
+            continue
+        if (
+            table.name not in ALLOWED_TABLES
+            or table.db != DATASET_ID
+            or table.catalog not in ("", PROJECT_ID)
+        ):
+            name = ".".join(p for p in (table.catalog, table.db, table.name) if p)
+            raise UnsafeQuery(f"Table not allowed: {name}")
+        tables.append(table)
+    return tables
+
+
+def _conjuncts(condition) -> list:
+    if condition is None:
+        return []
+    condition = condition.unnest()
+    if isinstance(condition, exp.And):
+        return [c.unnest() for c in condition.flatten()]
+    return [condition]
+
+
+def _is_column(node, name: str, alias: str) -> bool:
+    return isinstance(node, exp.Column) and node.name == name and node.table in ("", alias)
+
+
+def _has_app_filter(conjuncts: list, alias: str, app: str) -> bool:
+    for c in conjuncts:
+        if not isinstance(c, exp.EQ):
+            continue
+        for col, value in ((c.this, c.expression), (c.expression, c.this)):
+            if (
+                _is_column(col, "app", alias)
+                and isinstance(value, exp.Literal)
+                and value.is_string
+                and value.this == app
+            ):
+                return True
+    return False
+
+
+def _has_date_lower_bound(conjuncts: list, alias: str) -> bool:
+    for c in conjuncts:
+        if isinstance(c, (exp.Between, exp.In)) and _is_column(c.this, "metric_date", alias):
+            return True
+        if isinstance(c, (exp.EQ, exp.GT, exp.GTE)) and _is_column(c.this, "metric_date", alias):
+            return True
+        if isinstance(c, (exp.EQ, exp.LT, exp.LTE)) and _is_column(
+            c.expression, "metric_date", alias
+        ):
+            return True
+    return False
+
+
+def _date_upper_bound(conjuncts: list, alias: str):
+    """
+    The value of a `metric_date <(=) x` (or `x >(=) metric_date`) conjunct,
+    or None if there is none.
+    """
+    for c in conjuncts:
+        if isinstance(c, (exp.LT, exp.LTE)) and _is_column(c.this, "metric_date", alias):
+            return c.expression
+        if isinstance(c, (exp.GT, exp.GTE)) and _is_column(c.expression, "metric_date", alias):
+            return c.this
+    return None
+
+
+def _enforce_filters(table, app: str) -> None:
+    """
+    AND `app = '<app>'` and a metric_date lower bound into the scope that
+    reads `table` (the JOIN's ON clause for joined tables, so LEFT JOINs
+    stay LEFT JOINs; WHERE otherwise), unless they're already there.
+    The lower bound is QUERY_MAX_LOOKBACK_DAYS before the query's own
+    metric_date upper bound if it has one (so historical questions keep
+    their rows), before today otherwise.
+    """
+    select = table.find_ancestor(exp.Select)
+    if select is None:
+        return
+
+    join = table.parent if isinstance(table.parent, exp.Join) else None
+    if join is not None and join.args.get("on") is None:
+        join = None  # comma / CROSS / USING joins: filter in WHERE instead
+
+    alias = table.alias_or_name
+    qualify = bool(select.args.get("joins"))
+
+    def column(name: str):
+        return exp.column(name, table=exp.to_identifier(alias) if qualify else None)
+
+    if join is not None:
+        existing = _conjuncts(join.args["on"])
+    else:
+        where = select.args.get("where")
+        existing = _conjuncts(where.this if where is not None else None)
+
+    conditions = []
+    if not _has_app_filter(existing, alias, app):
+        conditions.append(exp.EQ(this=column("app"), expression=exp.Literal.string(app)))
+    if not _has_date_lower_bound(existing, alias):
+        upper = _date_upper_bound(existing, alias)
+        conditions.append(
+            exp.GTE(
+                this=column("metric_date"),
+                expression=exp.DateSub(
+                    this=exp.cast(upper.copy(), "DATE") if upper is not None else exp.CurrentDate(),
+                    expression=exp.Literal.number(QUERY_MAX_LOOKBACK_DAYS),
+                    unit=exp.var("DAY"),
+                ),
+            )
+        )
+
+    if not conditions:
+        return
+    if join is not None:
+        join.set("on", exp.and_(join.args["on"], *conditions))
+    else:
+        select.where(*conditions, copy=False)
+
+
+def _enforce_limit(tree, max_rows: int):
+    limit = tree.args.get("limit")
+    if limit is not None:
+        value = limit.expression
+        if isinstance(value, exp.Literal) and value.is_int and int(value.this) <= max_rows:
+            return tree
+        limit.set("expression", exp.Literal.number(max_rows))
+        return tree
+    if isinstance(tree, exp.Select):
+        return tree.limit(max_rows, copy=False)
+    # UNION etc.: LIMIT applies to the whole set operation
+    tree.set("limit", exp.Limit(expression=exp.Literal.number(max_rows)))
+    return tree
+
+
+@lru_cache(maxsize=256)
+def enforce(sql: str, app: str, max_rows: int) -> str:
+    """
+    Validate generated BigQuery SQL and rewrite it to the query policy:
+      - exactly one SELECT statement (no DML / DDL / scripting)
+      - only ALLOWED_TABLES in DATASET_ID (CTEs may be referenced freely)
+      - every table read filtered by `app` and a metric_date lower bound
+        (QUERY_MAX_LOOKBACK_DAYS before its upper bound, or before today,
+        when the query has none)
+      - outer LIMIT added, or clamped to min(max_rows, QUERY_MAX_ROWS)
+    Returns the rewritten SQL; raises UnsafeQuery if it can't be made safe.
+    """
+    tree = _parse(sql)
+
+    for table in _base_tables(tree):
+        _enforce_filters(table, app)
+
+    tree = _enforce_limit(tree, max(1, min(max_rows, QUERY_MAX_ROWS)))
+    return tree.sql(dialect="bigquery", pretty=True)
@@ -0,0 +1,95 @@
+# backend/sql_repair.py
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+# How many times a generated query that fails validation (sql_guard or the
+# warehouse dry run) is sent back to the model with the error to be fixed.
+SQL_REPAIR_ATTEMPTS = int(os.getenv("SQL_REPAIR_ATTEMPTS", "2"))
+
+
+class InvalidSQL(ValueError):
+    pass
+
+
+class RepairFailed(Exception):
+    def __init__(self, error: str, sql: str, attempts: list):
+        super().__init__(error)
+        self.sql = sql
+        self.attempts = attempts
+
+
+def repair_prompt(prompt: str, sql: str, error: str) -> str:
+    return f"""{prompt}
+
+Your previous answer was:
+```sql
+{sql}
+```
+
+It failed validation with this error:
+{error}
+
+Fix the query so it answers the same question. Wrap ONLY the SQL in a ```sql ... ``` block.
+"""
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000.0, 2)
+
+
+async def validate_and_repair(
+    prompt: str,
+    generate,
+    validate,
+    sql: str = None,
+    max_repairs: int = SQL_REPAIR_ATTEMPTS,
+    sql_stage: str = "given",
+):
+    """
+    `await generate(prompt)` for SQL (unless `sql` is given), then `await validate(sql)`.
+    validate() raises InvalidSQL with a message the model can act on; on
+    failure the model is asked to fix the query, up to `max_repairs` times.
+
+    Returns (sql, validate() result, attempts); raises RepairFailed once
+    the repairs are used up. `attempts` has one entry per generate/validate
+    round with its latency split, for the response; a given `sql` is
+    recorded as stage `sql_stage`.
+    """
+    attempts = []
+    error = None
+
+    for n in range(max_repairs + 1):
+        entry = {"attempt": n + 1}
+        if n == 0 and sql is not None:
+            entry["stage"] = sql_stage
+        else:
+            entry["stage"] = "generate" if n == 0 else "repair"
+            started = time.perf_counter()
+            sql = await generate(prompt if n == 0 else repair_prompt(prompt, sql, error))
+            entry["model_ms"] = _ms(started)
+
+        started = time.perf_counter()
+        try:
+            result = await validate(sql)
+            error = None
+        except InvalidSQL as e:
+            error = str(e)
+        entry.update({"sql": sql, "validate_ms": _ms(started), "error": error})
+        attempts.append(entry)
+
+        logger.info(
+            f"[SQL ATTEMPT] {entry['attempt']} stage={entry['stage']} "
+            f"model_ms={entry.get('model_ms')} validate_ms={entry['validate_ms']} "
+            f"error={error!r}"
+        )
+        if error is None:
+            return sql, result, attempts
+
+    raise RepairFailed(error, sql, attempts)
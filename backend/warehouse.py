@@ -0,0 +1,823 @@
+# backend/warehouse.py
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from backend import deadlines
+
+load_dotenv()
+
+logger = logging.getLogger("cloudreign")
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")
+
+# "bigquery" (default) or "local" (embedded DuckDB file, no GCP needed)
+WAREHOUSE_BACKEND = os.getenv("WAREHOUSE_BACKEND", "bigquery").lower()
+LOCAL_WAREHOUSE_PATH = os.getenv("LOCAL_WAREHOUSE_PATH", "local_warehouse.duckdb")
+
+# keep-alive connections shared by all request threads (uvicorn's threadpool is 40)
+BQ_HTTP_POOL_SIZE = int(os.getenv("BQ_HTTP_POOL_SIZE", "40"))
+
+# rows per Arrow batch when streaming results from the local engine
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "10000"))
+
+# local engine: paginated results whose cursor was abandoned are dropped
+# after this long (BigQuery expires its anonymous result tables after ~24h)
+LOCAL_RESULT_TTL_SECONDS = int(os.getenv("LOCAL_RESULT_TTL_SECONDS", "86400"))
+
+# BigQuery schema types -> DuckDB column types
+_DUCKDB_TYPES = {
+    "STRING": "VARCHAR",
+    "INT64": "BIGINT",
+    "INTEGER": "BIGINT",
+    "FLOAT": "DOUBLE",
+    "FLOAT64": "DOUBLE",
+    "NUMERIC": "DECIMAL(38, 9)",
+    "BIGNUMERIC": "DOUBLE",
+    "BOOL": "BOOLEAN",
+    "BOOLEAN": "BOOLEAN",
+    "DATE": "DATE",
+    "TIMESTAMP": "TIMESTAMPTZ",
+    "DATETIME": "TIMESTAMP",
+}
+
+
+class Warehouse:
+    """
+    Storage + SQL engine used by ingest, refresh and the API routes.
+
+    All SQL is written in BigQuery dialect with `project.dataset.table`
+    references and @named parameters; backends translate as needed.
+    """
+
+    def query(self, sql: str, params: dict = None) -> list:
+        """
+        Run a SELECT and return the rows (dict-like: support .items()).
+        """
+        raise NotImplementedError
+
+    def query_arrow(self, sql: str, params: dict = None):
+        """
+        Run a SELECT and return the result as a pyarrow.Table.
+        """
+        raise NotImplementedError
+
+    async def query_arrow_async(self, sql: str, params: dict = None):
+        """
+        Non-blocking query_arrow() for async routes. By default the query runs
+        in a worker thread; backends with real job APIs override this.
+        """
+        return await asyncio.to_thread(self.query_arrow, sql, params)
+
+    async def run_query_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        """
+        Like query_arrow_async(), but returns (pyarrow.Table, job_info) where
+        job_info = {"cache_hit": bool, "bytes_processed": int or None,
+        "bytes_billed": int or None}. `maximum_bytes_billed` makes the job
+        fail instead of billing more (backends without billing ignore it).
+        """
+        table = await self.query_arrow_async(sql, params)
+        return table, {"cache_hit": False, "bytes_processed": None, "bytes_billed": None}
+
+    def dry_run(self, sql: str, params: dict = None):
+        """
+        Validate the query without running it. Returns the bytes it would
+        process (None if the backend can't estimate); raises if it's invalid.
+        """
+        raise NotImplementedError
+
+    async def dry_run_async(self, sql: str, params: dict = None):
+        return await asyncio.to_thread(self.dry_run, sql, params)
+
+    async def stream_arrow_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        """
+        Run the query, then return a (blocking) iterator of pyarrow.RecordBatch
+        that reads results as they arrive instead of materializing them.
+        Query errors are raised here, before the first batch.
+        """
+        raise NotImplementedError
+
+    async def query_page_async(
+        self,
+        sql: str,
+        params: dict = None,
+        page_size: int = 100,
+        maximum_bytes_billed: int = None,
+    ):
+        """
+        Run the query once and return (first page as pyarrow.Table, state).
+        `state` is a small JSON-able dict (None after the last page) that
+        fetch_page_async() uses to read the next page from the saved result,
+        without running the SQL again.
+        """
+        raise NotImplementedError
+
+    async def fetch_page_async(self, state: dict, page_size: int = 100):
+        """
+        Next page for a state from query_page_async(): (pyarrow.Table, state).
+        """
+        raise NotImplementedError
+
+    def execute(self, sql: str, params: dict = None) -> None:
+        """
+        Run DDL / DML (CREATE TABLE AS, MERGE, DROP, ...) and wait for it.
+        """
+        raise NotImplementedError
+
+    def ensure_table(self, table_id: str, schema: list, location: str = None) -> None:
+        """
+        Create dataset + table if they don't exist yet.
+        """
+        raise NotImplementedError
+
+    def load_rows(self, table_id: str, rows: list, schema: list, location: str = None) -> int:
+        """
+        Replace the table contents with `rows` (WRITE_TRUNCATE).
+        Returns number of rows in the table after load.
+        """
+        raise NotImplementedError
+
+    def num_rows(self, table_id: str) -> int:
+        raise NotImplementedError
+
+    def table_schema(self, table_id: str) -> list:
+        """
+        [(column name, type), ...] from table metadata, without a query.
+        """
+        raise NotImplementedError
+
+    def read_arrow(self, table_id: str):
+        """
+        Read a whole table as a pyarrow.Table.
+        """
+        raise NotImplementedError
+
+    def warm(self) -> None:
+        """
+        Run a trivial query so credentials, tokens and connections are ready
+        before the first real request.
+        """
+        self.query("SELECT 1 AS ok")
+
+    def close(self) -> None:
+        pass
+
+    def merge_rows(
+        self,
+        table_id: str,
+        rows: list,
+        schema: list,
+        key_columns: list,
+        location: str = None,
+    ) -> int:
+        """
+        Upsert `rows` into the table on `key_columns` via a staging table.
+        Returns number of rows in the table after merge.
+        """
+        staging_id = f"{table_id}_staging"
+        self.ensure_table(table_id, schema, location=location)
+        self.load_rows(staging_id, rows, schema, location=location)
+
+        columns = [f.name for f in schema]
+        on = " AND ".join(f"T.{k} = S.{k}" for k in key_columns)
+        updates = ", ".join(f"{c} = S.{c}" for c in columns if c not in key_columns)
+        inserts = ", ".join(columns)
+        values = ", ".join(f"S.{c}" for c in columns)
+
+        self.execute(
+            f"""
+            MERGE `{table_id}` AS T
+            USING `{staging_id}` AS S
+            ON {on}
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ({inserts}) VALUES ({values})
+            """
+        )
+        self.execute(f"DROP TABLE IF EXISTS `{staging_id}`")
+        return self.num_rows(table_id)
+
+
+# --------- BIGQUERY ---------
+def _bq_type(value) -> str:
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, int):
+        return "INT64"
+    if isinstance(value, float):
+        return "FLOAT64"
+    if isinstance(value, datetime):
+        return "TIMESTAMP"
+    if isinstance(value, date):
+        return "DATE"
+    return "STRING"
+
+
+def query_parameters(params: dict) -> list:
+    """
+    Turn a {name: value} dict into BigQuery query parameters.
+    """
+    from google.cloud import bigquery
+
+    out = []
+    for name, value in (params or {}).items():
+        if isinstance(value, (list, tuple)):
+            type_ = _bq_type(value[0]) if value else "STRING"
+            out.append(bigquery.ArrayQueryParameter(name, type_, list(value)))
+        else:
+            out.append(bigquery.ScalarQueryParameter(name, _bq_type(value), value))
+    return out
+
+
+class BigQueryWarehouse(Warehouse):
+    def __init__(self, project: str = PROJECT_ID, service_account_file: str = SERVICE_ACCOUNT_FILE):
+        # imported here, not at module level: google-cloud-bigquery is the
+        # slowest import in the backend and local-warehouse workers never use it
+        import requests
+        from google.auth.transport.requests import AuthorizedSession
+        from google.cloud import bigquery
+        from google.oauth2 import service_account
+
+        credentials = service_account.Credentials.from_service_account_file(
+            service_account_file,
+            scopes=bigquery.Client.SCOPE,
+        )
+
+        # one authorized session with a connection pool sized for the threadpool
+        session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=BQ_HTTP_POOL_SIZE,
+            pool_maxsize=BQ_HTTP_POOL_SIZE,
+        )
+        session.mount("https://", adapter)
+
+        self.client = bigquery.Client(
+            project=project,
+            credentials=credentials,
+            _http=session,
+        )
+        self._credentials = credentials
+        self._bqstorage_client = None
+        self.cancelled_jobs = 0
+
+    def query(self, sql: str, params: dict = None) -> list:
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters(params))
+        job = self.client.query(sql, job_config=job_config)
+        return list(job.result())
+
+    def query_arrow(self, sql: str, params: dict = None):
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters(params))
+        job = self.client.query(sql, job_config=job_config)
+        return job.to_arrow()
+
+    async def _run_job_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        """
+        Submit the job, then poll its state from the event loop. A thread is
+        only held for each short HTTP call, never for the whole job, so many
+        jobs can be in flight at once.
+        """
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=query_parameters(params),
+            maximum_bytes_billed=maximum_bytes_billed,
+        )
+
+        # BigQuery stops the job itself if we never get to cancel it
+        remaining = deadlines.remaining()
+        if remaining is not None:
+            job_config.job_timeout_ms = max(int(remaining * 1000), 1000)
+
+        # our own job id, so the job can be cancelled even while it's submitted
+        job_id = f"cloudreign_{uuid.uuid4().hex}"
+        job = None
+        try:
+            job = await asyncio.to_thread(
+                self.client.query, sql, job_config=job_config, job_id=job_id
+            )
+
+            delay = 0.05
+            while True:
+                await asyncio.sleep(delay)
+                await asyncio.to_thread(job.reload)
+                if job.state == "DONE":
+                    return job
+                delay = min(delay * 2, 1.0)
+        except asyncio.CancelledError:
+            # request cancelled (deadline / client disconnect): free the slots
+            self._cancel_job(job_id, job.location if job is not None else None)
+            raise
+
+    def _cancel_job(self, job_id: str, location: str = None) -> None:
+        """
+        Fire-and-forget jobs.cancel; never blocks the (cancelled) caller.
+        """
+        def cancel():
+            try:
+                self.client.cancel_job(job_id, location=location or self.client.location)
+                self.cancelled_jobs += 1
+                logger.info(f"[WAREHOUSE] cancelled job {job_id}")
+            except Exception as e:
+                logger.warning(f"[WAREHOUSE] cancel of job {job_id} failed: {e}")
+
+        threading.Thread(target=cancel, daemon=True).start()
+
+    async def query_arrow_async(self, sql: str, params: dict = None):
+        job = await self._run_job_async(sql, params)
+        return await asyncio.to_thread(job.to_arrow)
+
+    async def run_query_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        job = await self._run_job_async(sql, params, maximum_bytes_billed)
+        table = await asyncio.to_thread(job.to_arrow)
+        return table, {
+            "cache_hit": bool(job.cache_hit),
+            "bytes_processed": job.total_bytes_processed,
+            "bytes_billed": job.total_bytes_billed,
+        }
+
+    def dry_run(self, sql: str, params: dict = None):
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=query_parameters(params),
+            dry_run=True,
+            use_query_cache=False,
+        )
+        job = self.client.query(sql, job_config=job_config)
+        return job.total_bytes_processed
+
+    @property
+    def bqstorage_client(self):
+        """
+        Shared BigQuery Storage Read API client, or None if
+        google-cloud-bigquery-storage isn't installed (REST paging is used then).
+        """
+        if self._bqstorage_client is None:
+            try:
+                from google.cloud import bigquery_storage
+            except ImportError:
+                return None
+            self._bqstorage_client = bigquery_storage.BigQueryReadClient(
+                credentials=self._credentials
+            )
+        return self._bqstorage_client
+
+    async def stream_arrow_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        job = await self._run_job_async(sql, params, maximum_bytes_billed)
+        rows = await asyncio.to_thread(job.result)
+        # read streams are consumed in parallel; a small queue keeps memory bounded
+        return rows.to_arrow_iterable(
+            bqstorage_client=self.bqstorage_client,
+            max_queue_size=2,
+        )
+
+    def _list_page(self, table_id: str, page_size: int, page_token: str = None):
+        """
+        One tabledata.list page of a job's destination table.
+        """
+        rows = self.client.list_rows(
+            table_id,
+            max_results=page_size,
+            page_size=page_size,
+            page_token=page_token,
+        )
+        page = rows.to_arrow(create_bqstorage_client=False)
+        if not rows.next_page_token:
+            return page, None
+        return page, {"table": table_id, "page_token": rows.next_page_token}
+
+    async def query_page_async(
+        self,
+        sql: str,
+        params: dict = None,
+        page_size: int = 100,
+        maximum_bytes_billed: int = None,
+    ):
+        job = await self._run_job_async(sql, params, maximum_bytes_billed)
+        if job.error_result:
+            raise RuntimeError(job.error_result.get("message", "Query failed"))
+
+        # every query job writes to a (temporary, ~24h) destination table;
+        # later pages are read from it with page tokens
+        dest = job.destination
+        table_id = f"{dest.project}.{dest.dataset_id}.{dest.table_id}"
+        return await asyncio.to_thread(self._list_page, table_id, page_size)
+
+    async def fetch_page_async(self, state: dict, page_size: int = 100):
+        return await asyncio.to_thread(
+            self._list_page, state["table"], page_size, state["page_token"]
+        )
+
+    def execute(self, sql: str, params: dict = None) -> None:
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters(params))
+        self.client.query(sql, job_config=job_config).result()
+
+    def ensure_table(self, table_id: str, schema: list, location: str = None) -> None:
+        from google.cloud.bigquery import Dataset, Table
+
+        dataset_ref = table_id.rsplit(".", 1)[0]
+
+        try:
+            dataset = Dataset(dataset_ref)
+            dataset.location = location
+            self.client.create_dataset(dataset, exists_ok=True)
+        except Exception as e:
+            print("Dataset create/check error:", e)
+
+        try:
+            self.client.create_table(Table(table_id, schema=schema), exists_ok=True)
+        except Exception as e:
+            print("Table create error (maybe existed):", e)
+
+    def load_rows(self, table_id: str, rows: list, schema: list, location: str = None) -> int:
+        self.ensure_table(table_id, schema, location=location)
+        if not rows:
+            return 0
+
+        from google.cloud import bigquery
+
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+        )
+        load_job = self.client.load_table_from_json(rows, table_id, job_config=job_config)
+        load_job.result()
+        return self.num_rows(table_id)
+
+    def num_rows(self, table_id: str) -> int:
+        return self.client.get_table(table_id).num_rows
+
+    def table_schema(self, table_id: str) -> list:
+        return [(f.name, f.field_type) for f in self.client.get_table(table_id).schema]
+
+    def read_arrow(self, table_id: str):
+        return self.client.list_rows(table_id).to_arrow()
+
+    def close(self) -> None:
+        self.client.close()
+
+
+# --------- LOCAL (DuckDB) ---------
+@lru_cache(maxsize=256)
+def to_local_sql(sql: str) -> tuple:
+    """
+    Translate BigQuery SQL into DuckDB statements.
+    `project.dataset.table` becomes "dataset"."table" (the project is dropped).
+    """
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import ErrorLevel
+
+    statements = []
+    for tree in sqlglot.parse(sql, read="bigquery"):
+        if tree is None:
+            continue
+        for table in tree.find_all(exp.Table):
+            table.set("catalog", None)
+        # PARTITION BY / OPTIONS have no DuckDB equivalent and are dropped
+        statements.append(tree.sql(dialect="duckdb", unsupported_level=ErrorLevel.IGNORE))
+    return tuple(statements)
+
+
+def _row_numbered(statement: str) -> str:
+    """
+    Wrap a DuckDB SELECT so every row carries _row, its 0-based position in
+    the statement's ORDER BY. The ORDER BY goes inside the window: a bare
+    ROW_NUMBER() OVER () numbers rows in scan order, not the query's order.
+    Sort keys that aren't output columns ride along as hidden _order_<n>
+    columns.
+    """
+    import sqlglot
+    from sqlglot import exp
+
+    tree = sqlglot.parse_one(statement, read="duckdb")
+    order = tree.args.get("order")
+    keys, hidden = [], []
+    if order is not None:
+        # set operations order by output names; SELECTs may order by anything
+        projections = tree.expressions if isinstance(tree, exp.Select) else []
+        names = {p.alias_or_name for p in projections if not isinstance(p, exp.Star)}
+        for ordered in order.expressions:
+            key = ordered.this
+            if (
+                isinstance(key, exp.Literal)
+                and key.is_int
+                and 0 < int(key.this) <= len(projections)
+                and not isinstance(projections[int(key.this) - 1], exp.Star)
+            ):
+                name = projections[int(key.this) - 1].alias_or_name
+            elif isinstance(key, exp.Column) and not key.table and (key.name in names or not projections):
+                name = key.name
+            elif isinstance(tree, exp.Select) and not tree.args.get("distinct"):
+                name = f"_order_{len(hidden)}"
+                hidden.append(name)
+                tree.select(exp.alias_(key.copy(), name), copy=False)
+            else:
+                continue
+            key = ordered.copy()
+            key.set("this", exp.column(name, quoted=True))
+            keys.append(key.sql(dialect="duckdb"))
+
+    window = f"ORDER BY {', '.join(keys)}" if keys else ""
+    exclude = f" EXCLUDE ({', '.join(hidden)})" if hidden else ""
+    return (
+        f"SELECT *{exclude}, (ROW_NUMBER() OVER ({window}) - 1) AS _row "
+        f"FROM ({tree.sql(dialect='duckdb')}) AS _q"
+    )
+
+
+def _quote_table(table_id: str) -> tuple:
+    dataset, table = table_id.split(".")[-2:]
+    return dataset, f'"{dataset}"."{table}"'
+
+
+class LocalWarehouse(Warehouse):
+    """
+    Embedded stand-in for BigQuery: one DuckDB file, datasets become schemas.
+    Runs the same refresh + analytics SQL through to_local_sql().
+    """
+
+    def __init__(self, path: str = LOCAL_WAREHOUSE_PATH):
+        import duckdb
+
+        self.path = path
+        self._con = duckdb.connect(path)
+        self._con.execute("SET TimeZone = 'UTC'")
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        # one cursor per call: DuckDB connections aren't shared across threads
+        cur = self._con.cursor()
+        cur.execute("SET TimeZone = 'UTC'")
+        return cur
+
+    def _run(self, cur, sql: str, params: dict = None):
+        statements = to_local_sql(sql)
+        for stmt in statements[:-1]:
+            cur.execute(stmt)
+        return cur.execute(statements[-1], params or {})
+
+    def query(self, sql: str, params: dict = None) -> list:
+        cur = self._cursor()
+        try:
+            self._run(cur, sql, params)
+            columns = [d[0] for d in cur.description]
+            return [dict(zip(columns, r)) for r in cur.fetchall()]
+        finally:
+            cur.close()
+
+    def query_arrow(self, sql: str, params: dict = None):
+        cur = self._cursor()
+        try:
+            return self._run(cur, sql, params).fetch_arrow_table()
+        finally:
+            cur.close()
+
+    async def query_arrow_async(self, sql: str, params: dict = None):
+        cur = self._cursor()
+
+        def run():
+            try:
+                return self._run(cur, sql, params).fetch_arrow_table()
+            finally:
+                cur.close()
+
+        try:
+            return await asyncio.to_thread(run)
+        except asyncio.CancelledError:
+            # request cancelled (deadline / client disconnect): stop the query
+            cur.interrupt()
+            raise
+
+    async def stream_arrow_async(
+        self, sql: str, params: dict = None, maximum_bytes_billed: int = None
+    ):
+        cur = self._cursor()
+        try:
+            reader = await asyncio.to_thread(
+                lambda: self._run(cur, sql, params).fetch_record_batch(STREAM_BATCH_ROWS)
+            )
+        except Exception:
+            cur.close()
+            raise
+
+        def batches():
+            try:
+                yield from reader
+            finally:
+                cur.close()
+
+        return batches()
+
+    def _read_page(self, table: str, offset: int, page_size: int):
+        """
+        Page of a materialized result table; dropped after its last page.
+        """
+        cur = self._cursor()
+        try:
+            page = cur.execute(
+                f'SELECT * EXCLUDE (_row) FROM "_results"."{table}" '
+                f"WHERE _row >= ? ORDER BY _row LIMIT ?",
+                [offset, page_size],
+            ).fetch_arrow_table()
+            total = cur.execute(f'SELECT COUNT(*) FROM "_results"."{table}"').fetchone()[0]
+            if offset + page.num_rows >= total:
+                cur.execute(f'DROP TABLE IF EXISTS "_results"."{table}"')
+                return page, None
+            return page, {"table": table, "offset": offset + page.num_rows}
+        finally:
+            cur.close()
+
+    def _sweep_results(self, cur) -> int:
+        """
+        Drop result tables older than LOCAL_RESULT_TTL_SECONDS: pages whose
+        last page was never read (the client stopped paging).
+        """
+        cutoff = int(time.time()) - LOCAL_RESULT_TTL_SECONDS
+        names = cur.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE schema_name = '_results'"
+        ).fetchall()
+        dropped = 0
+        for (name,) in names:
+            created = name.split("_")[1] if name.count("_") >= 2 else ""
+            if created.isdigit() and int(created) < cutoff:
+                cur.execute(f'DROP TABLE IF EXISTS "_results"."{name}"')
+                dropped += 1
+        if dropped:
+            logger.info(f"[WAREHOUSE] dropped {dropped} expired local result table(s)")
+        return dropped
+
+    def _query_page(self, sql: str, params: dict, page_size: int):
+        # stand-in for BigQuery's anonymous destination tables; the name
+        # carries the creation time so abandoned ones can be swept
+        table = f"r_{int(time.time())}_{uuid.uuid4().hex}"
+        cur = self._cursor()
+        try:
+            statements = to_local_sql(sql)
+            for stmt in statements[:-1]:
+                cur.execute(stmt)
+            cur.execute('CREATE SCHEMA IF NOT EXISTS "_results"')
+            self._sweep_results(cur)
+            cur.execute(
+                f'CREATE TABLE "_results"."{table}" AS {_row_numbered(statements[-1])}',
+                params or {},
+            )
+        finally:
+            cur.close()
+        return self._read_page(table, 0, page_size)
+
+    async def query_page_async(
+        self,
+        sql: str,
+        params: dict = None,
+        page_size: int = 100,
+        maximum_bytes_billed: int = None,
+    ):
+        return await asyncio.to_thread(self._query_page, sql, params, page_size)
+
+    def dry_run(self, sql: str, params: dict = None):
+        # DuckDB has no byte estimates; EXPLAIN still binds and plans the
+        # query, so invalid SQL fails here like a BigQuery dry run
+        cur = self._cursor()
+        try:
+            statements = to_local_sql(sql)
+            for stmt in statements[:-1]:
+                cur.execute(stmt)
+            cur.execute(f"EXPLAIN {statements[-1]}", params or {})
+            return None
+        finally:
+            cur.close()
+
+    async def fetch_page_async(self, state: dict, page_size: int = 100):
+        return await asyncio.to_thread(
+            self._read_page, state["table"], state["offset"], page_size
+        )
+
+    def execute(self, sql: str, params: dict = None) -> None:
+        cur = self._cursor()
+        try:
+            self._run(cur, sql, params)
+        finally:
+            cur.close()
+
+    def ensure_table(self, table_id: str, schema: list, location: str = None) -> None:
+        dataset, quoted = _quote_table(table_id)
+        columns = ", ".join(
+            f'"{f.name}" {_DUCKDB_TYPES.get(f.field_type, "VARCHAR")}' for f in schema
+        )
+        with self._lock:
+            self._con.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset}"')
+            self._con.execute(f"CREATE TABLE IF NOT EXISTS {quoted} ({columns})")
+
+    def load_rows(self, table_id: str, rows: list, schema: list, location: str = None) -> int:
+        import pyarrow as pa
+
+        self.ensure_table(table_id, schema, location=location)
+        if not rows:
+            return 0
+
+        _, quoted = _quote_table(table_id)
+        columns = ", ".join(
+            f'"{f.name}" {_DUCKDB_TYPES.get(f.field_type, "VARCHAR")}' for f in schema
+        )
+
+        with self._lock:
+            self._con.execute(f"CREATE OR REPLACE TABLE {quoted} ({columns})")
+
+            # bulk insert through Arrow; strings (e.g. ISO timestamps) are cast
+            # to the schema types the same way a BigQuery JSON load would
+            batch = pa.Table.from_pylist(rows)
+            select = ", ".join(
+                f'CAST("{f.name}" AS {_DUCKDB_TYPES.get(f.field_type, "VARCHAR")})'
+                if f.name in batch.column_names
+                else "NULL"
+                for f in schema
+            )
+            self._con.register("_load_rows", batch)
+            try:
+                self._con.execute(f"INSERT INTO {quoted} SELECT {select} FROM _load_rows")
+            finally:
+                self._con.unregister("_load_rows")
+
+        return self.num_rows(table_id)
+
+    def num_rows(self, table_id: str) -> int:
+        _, quoted = _quote_table(table_id)
+        cur = self._cursor()
+        try:
+            return cur.execute(f"SELECT COUNT(*) FROM {quoted}").fetchone()[0]
+        finally:
+            cur.close()
+
+    def table_schema(self, table_id: str) -> list:
+        _, quoted = _quote_table(table_id)
+        cur = self._cursor()
+        try:
+            return [(r[0], r[1]) for r in cur.execute(f"DESCRIBE {quoted}").fetchall()]
+        finally:
+            cur.close()
+
+    def read_arrow(self, table_id: str):
+        _, quoted = _quote_table(table_id)
+        cur = self._cursor()
+        try:
+            return cur.execute(f"SELECT * FROM {quoted}").fetch_arrow_table()
+        finally:
+            cur.close()
+
+
+    def close(self) -> None:
+        self._con.close()
+
+
+_warehouse = None
+_warehouse_lock = threading.Lock()
+
+
+def get_warehouse() -> Warehouse:
+    """
+    Process-wide warehouse selected by WAREHOUSE_BACKEND.
+    Built once (normally at app startup) and shared by every caller.
+    """
+    global _warehouse
+    if _warehouse is None:
+        with _warehouse_lock:
+            if _warehouse is None:
+                if WAREHOUSE_BACKEND == "local":
+                    _warehouse = LocalWarehouse()
+                else:
+                    _warehouse = BigQueryWarehouse()
+    return _warehouse
+
+
+def close_warehouse() -> None:
+    """
+    Release the shared warehouse (app shutdown).
+    """
+    global _warehouse
+    with _warehouse_lock:
+        if _warehouse is not None:
+            _warehouse.close()
+            _warehouse = None
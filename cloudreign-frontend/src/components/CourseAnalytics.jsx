@@ -30,6 +30,9 @@ export default function CourseAnalytics() {
 
   const [days, setDays] = useState(30); // time window
 
+  // every course's series for one window, from a single batch request
+  const [seriesBatch, setSeriesBatch] = useState(null); // { days, series }
+
   // ---------- LOAD COURSE LIST ON MOUNT ----------
   useEffect(() => {
     async function fetchCourses() {
@@ -70,23 +73,38 @@ export default function CourseAnalytics() {
       setSelectedCourseId(course.course_id);
       setSelectedCourseMeta(course);
 
-      const res = await fetch(`${BASE_URL}/analytics/course_timeseries`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          app: "classroom",
-          course_id: String(course.course_id), // force string
-          days: Number(days) || 30,
-        }),
-      });
-
-      if (!res.ok) {
-        const text = await res.text();
-        throw new Error(`HTTP ${res.status}: ${text}`);
+      const windowDays = Number(days) || 30;
+      const courseKey = String(course.course_id);
+      let series = seriesBatch?.days === windowDays ? seriesBatch.series : null;
+
+      // every course gets an entry (empty when it has no rows in the
+      // window), so a missing one means the batch predates that course
+      if (!series || !(courseKey in series)) {
+        // one query for all courses; switching courses is then free
+        const res = await fetch(
+          `${BASE_URL}/analytics/course_timeseries/batch`,
+          {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+              app: "classroom",
+              course_ids: "all",
+              days: windowDays,
+            }),
+          }
+        );
+
+        if (!res.ok) {
+          const text = await res.text();
+          throw new Error(`HTTP ${res.status}: ${text}`);
+        }
+
+        const json = await res.json();
+        series = json.series || {};
+        setSeriesBatch({ days: windowDays, series });
       }
 
-      const json = await res.json();
-      setTimeseries(json.data || []);
+      setTimeseries(series[courseKey] || []);
     } catch (err) {
       console.error("Error fetching timeseries:", err);
       setTsError(err instanceof Error ? err.message : "Unknown error");
@@ -4,6 +4,10 @@ import { useEffect, useMemo, useState } from "react";
 const API_BASE =
   import.meta.env.VITE_BACKEND_URL || "http://127.0.0.1:8000";
 
+// upper bound on rows the checkpoint query reads; the table shows them one
+// page ("Rows") at a time via /query/page cursors
+const MAX_ROWS = 5000;
+
 export default function DashboardPreview() {
   const [rows, setRows] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -11,6 +15,7 @@ export default function DashboardPreview() {
   const [limit, setLimit] = useState(50);
   const [selectedCourseId, setSelectedCourseId] = useState("ALL");
   const [backendRowCount, setBackendRowCount] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
 
   // --- derived: unique course options ---
   const courseOptions = useMemo(() => {
@@ -37,13 +42,15 @@ export default function DashboardPreview() {
       setLoading(true);
       setError("");
       setBackendRowCount(null);
+      setNextCursor(null);
 
       const res = await fetch(`${API_BASE}/query/checkpoint`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           app: "classroom",
-          limit: Number(limit) || 50,
+          limit: MAX_ROWS,
+          page_size: Number(limit) || 50,
         }),
       });
 
@@ -66,6 +73,7 @@ export default function DashboardPreview() {
       setBackendRowCount(
         typeof json.row_count === "number" ? json.row_count : data.length
       );
+      setNextCursor(json.next_cursor || null);
     } catch (err) {
       console.error("Failed to fetch dashboard_temp:", err);
       setError(err instanceof Error ? err.message : "Failed to fetch data.");
@@ -75,6 +83,46 @@ export default function DashboardPreview() {
     }
   }
 
+  // next page of the same result: the query is not re-run
+  async function loadMore() {
+    if (!nextCursor) return;
+    try {
+      setLoading(true);
+      setError("");
+
+      const res = await fetch(`${API_BASE}/query/page`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          cursor: nextCursor,
+          page_size: Number(limit) || 50,
+        }),
+      });
+
+      if (!res.ok) {
+        const text = await res.text();
+        throw new Error(
+          `Backend HTTP ${res.status}: ${text || res.statusText}`
+        );
+      }
+
+      const json = await res.json();
+      if (json.status && json.status !== "ok") {
+        throw new Error(json.message || `Backend status: ${json.status}`);
+      }
+
+      const data = Array.isArray(json.data) ? json.data : [];
+      setRows((prev) => [...prev, ...data]);
+      setBackendRowCount((prev) => (prev || 0) + data.length);
+      setNextCursor(json.next_cursor || null);
+    } catch (err) {
+      console.error("Failed to fetch next page:", err);
+      setError(err instanceof Error ? err.message : "Failed to fetch data.");
+    } finally {
+      setLoading(false);
+    }
+  }
+
   // initial load
   useEffect(() => {
     fetchDashboard();
@@ -128,6 +176,10 @@ export default function DashboardPreview() {
           {loading ? "Loading..." : "Refresh"}
         </button>
 
+        <button onClick={loadMore} disabled={loading || !nextCursor}>
+          Load more
+        </button>
+
         <span style={{ fontSize: "12px", color: "#555" }}>
           Showing {filteredRows.length} rows
           {backendRowCount !== null ? ` (backend row_count=${backendRowCount})` : ""}
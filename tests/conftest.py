@@ -0,0 +1,50 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# backend modules read their settings at import time: point everything at a
+# throwaway local warehouse before any of them is imported
+_TMP = tempfile.mkdtemp(prefix="cloudreign-tests-")
+os.environ.update(
+    {
+        "PROJECT_ID": "proj",
+        "DATASET_ID": "workspace_analytics",
+        "WAREHOUSE_BACKEND": "local",
+        "LOCAL_WAREHOUSE_PATH": os.path.join(_TMP, "warehouse.duckdb"),
+        "LOCAL_MIRROR_ENABLED": "false",
+        "LOCAL_MIRROR_DIR": os.path.join(_TMP, "local_mirror"),
+        "SNAPSHOTS_ENABLED": "false",
+        "SNAPSHOT_DIR": os.path.join(_TMP, "snapshots"),
+        "REFRESH_STATE_FILE": os.path.join(_TMP, "refresh_state.json"),
+        "NL_CACHE_FILE": os.path.join(_TMP, "nl_cache.json"),
+        "GEMINI_API_KEY": "test",
+        "GEMINI_BASE_URL": "http://127.0.0.1:9",
+    }
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    """
+    Small synthetic Classroom dataset in the local warehouse (course ids
+    100000..100019), with dashboard_temp and the rollups built.
+    """
+    from backend import seed_local_warehouse
+
+    return seed_local_warehouse.run(
+        num_courses=20, students_per_course=5, assignments_per_course=10, days=60
+    )
+
+
+@pytest.fixture
+def client(seeded):
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,153 @@
+# tests/test_admission.py
+import asyncio
+import logging
+
+import pytest
+
+from backend import admission
+from backend.admission import AdmissionMiddleware, FairScheduler, Rejected
+
+
+def test_users_are_served_round_robin_and_over_quota_is_rejected():
+    async def main():
+        scheduler = FairScheduler("nl", concurrency=2, queue=5, per_user=1, per_user_queue=3)
+        order = []
+
+        async def request(user, i):
+            try:
+                await scheduler.acquire(user, max_wait=2)
+            except Rejected:
+                order.append((user, i, "rejected"))
+                return
+            order.append((user, i))
+            await asyncio.sleep(0.02)
+            scheduler.release(user)
+
+        tasks = [asyncio.create_task(request("heavy", i)) for i in range(5)]
+        await asyncio.sleep(0.005)
+        tasks += [asyncio.create_task(request("light", i)) for i in range(2)]
+        await asyncio.gather(*tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(main())
+
+    assert ("heavy", 4, "rejected") in order  # 1 running + 3 queued is the cap
+    served = [entry[0] for entry in order if len(entry) == 2]
+    # light's requests don't wait behind all of heavy's
+    assert served.index("light") < served.index("heavy", 2)
+    assert stats["rejected"] == 1 and stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_full_queue_and_wait_timeout_reject():
+    async def main():
+        scheduler = FairScheduler("nl", concurrency=1, queue=1, per_user=1, per_user_queue=5)
+        await scheduler.acquire("a")
+        waiting = asyncio.create_task(scheduler.acquire("b", max_wait=0.05))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Rejected):
+            await scheduler.acquire("c")  # queue holds one
+        with pytest.raises(Rejected):
+            await waiting  # "a" never releases
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert stats["timed_out"] == 1 and stats["queued"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = FairScheduler("nl", concurrency=1, queue=5, per_user=1, per_user_queue=5)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release("a")
+        await scheduler.acquire("c", max_wait=0.1)
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert stats["queued"] == 0 and stats["active"] == 1
+
+
+def _scope(client="10.0.0.5", headers=()):
+    return {"type": "http", "client": (client, 1234), "headers": list(headers)}
+
+
+def test_user_header_is_ignored_unless_from_a_trusted_proxy(monkeypatch):
+    header = [(b"x-user-id", b"alice")]
+    assert admission._user(_scope(headers=header)) == "addr:10.0.0.5"
+
+    monkeypatch.setattr(admission, "ADMISSION_USER_HEADER", b"x-user-id")
+    assert admission._user(_scope(headers=header)) == "addr:10.0.0.5"
+
+    monkeypatch.setattr(admission, "ADMISSION_TRUSTED_PROXIES", frozenset({"10.0.0.5"}))
+    assert admission._user(_scope(headers=header)) == "header:alice"
+    assert admission._user(_scope()) == "addr:10.0.0.5"
+
+
+def test_authenticated_principal_wins():
+    class Principal:
+        is_authenticated = True
+        display_name = "bob"
+
+    scope = {**_scope(headers=[(b"x-user-id", b"alice")]), "user": Principal()}
+    assert admission._user(scope) == "user:bob"
+
+
+def test_middleware_answers_429_when_rejected(monkeypatch):
+    monkeypatch.setitem(
+        admission.schedulers,
+        "nl",
+        FairScheduler("nl", concurrency=1, queue=0, per_user=1, per_user_queue=0),
+    )
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def main():
+        sent = {1: [], 2: []}
+
+        async def call(n):
+            async def send(message):
+                sent[n].append(message)
+
+            scope = {**_scope(), "method": "POST", "path": "/query/nl"}
+            await AdmissionMiddleware(app)(scope, None, send)
+
+        first = asyncio.create_task(call(1))
+        await asyncio.sleep(0.01)
+        await call(2)
+        release.set()
+        await first
+        return sent
+
+    sent = asyncio.run(main())
+    assert sent[1][0]["status"] == 200
+    assert sent[2][0]["status"] == 429
+    assert (b"retry-after", b"1") in sent[2][0]["headers"]
+
+
+def test_missing_user_config_is_warned_about_at_startup(monkeypatch, caplog):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "ADMISSION_USER_HEADER", b"")
+    monkeypatch.setattr(admission, "ADMISSION_TRUSTED_PROXIES", frozenset())
+
+    with caplog.at_level(logging.WARNING, logger="cloudreign"):
+        AdmissionMiddleware(app=None)
+    assert "all users share one quota" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(admission, "ADMISSION_USER_HEADER", b"x-user-id")
+    with caplog.at_level(logging.WARNING, logger="cloudreign"):
+        AdmissionMiddleware(app=None)
+    assert "ADMISSION_TRUSTED_PROXIES is not set" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(admission, "ADMISSION_TRUSTED_PROXIES", frozenset({"10.0.0.1"}))
+    with caplog.at_level(logging.WARNING, logger="cloudreign"):
+        AdmissionMiddleware(app=None)
+    assert "[ADMISSION]" not in caplog.text
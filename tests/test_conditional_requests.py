@@ -0,0 +1,78 @@
+# tests/test_conditional_requests.py
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from backend import main, refresh_state
+
+URL = "/analytics/courses"
+TIMESERIES_URL = "/analytics/course_timeseries"
+
+
+def test_matching_etag_gets_304_without_a_body(client):
+    first = client.get(URL)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    again = client.get(URL, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    # weak comparison, lists and "*"
+    strong = etag.removeprefix("W/")
+    assert client.get(URL, headers={"If-None-Match": f'"other", {strong}'}).status_code == 304
+    assert client.get(URL, headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get(URL, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_depends_on_the_request(client):
+    rows = client.get(URL).headers["etag"]
+    columnar = client.get(URL + "?format=columnar").headers["etag"]
+    assert rows != columnar
+    assert client.get(URL + "?format=columnar", headers={"If-None-Match": rows}).status_code == 200
+
+
+def test_refresh_changes_the_etag(client):
+    etag = client.get(URL).headers["etag"]
+
+    refresh_state.bump()
+
+    response = client.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "MISS"
+    assert response.headers["etag"] != etag
+
+
+def test_if_modified_since(client):
+    last_modified = client.get(URL).headers["last-modified"]
+    assert client.get(URL, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)
+    assert client.get(URL, headers={"If-Modified-Since": earlier}).status_code == 200
+    assert client.get(URL, headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+
+def test_default_window_is_modified_at_midnight(client, monkeypatch):
+    refresh_state.bump(refreshed_at=time.time() - 3 * 86400)
+    body = {"course_id": "100000"}
+    yesterday = main.today_utc() - timedelta(days=1)
+
+    monkeypatch.setattr(main, "today_utc", lambda: yesterday)
+    last_modified = client.post(TIMESERIES_URL, json=body).headers["last-modified"]
+    assert client.post(
+        TIMESERIES_URL, json=body, headers={"If-Modified-Since": last_modified}
+    ).status_code == 304
+    monkeypatch.undo()
+
+    # the day rolled over: today's default window is new to this client
+    response = client.post(TIMESERIES_URL, json=body, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 200
+    assert parsedate_to_datetime(response.headers["last-modified"]).date() == main.today_utc()
+
+    # an explicit past as_of still matches
+    explicit = {**body, "as_of": yesterday.isoformat()}
+    last_modified = client.post(TIMESERIES_URL, json=explicit).headers["last-modified"]
+    assert client.post(
+        TIMESERIES_URL, json=explicit, headers={"If-Modified-Since": last_modified}
+    ).status_code == 304
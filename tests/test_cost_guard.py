@@ -0,0 +1,99 @@
+# tests/test_cost_guard.py
+import pytest
+
+from backend import cost_guard
+from backend.cursors import encode_cursor
+
+GiB = 1024 ** 3
+SQL = "SELECT course_id, SUM(late_submissions) AS late FROM `proj.workspace_analytics.dashboard_temp` GROUP BY course_id"
+
+
+def test_decide_and_cap():
+    assert cost_guard.decide(None) == "run"
+    assert cost_guard.decide(GiB // 2) == "run"
+    assert cost_guard.decide(2 * GiB) == "confirm"
+    assert cost_guard.decide(2 * GiB, approved_bytes=2 * GiB) == "run"
+    # approval covers small drift, not a much bigger query
+    assert cost_guard.decide(3 * GiB, approved_bytes=2 * GiB) == "confirm"
+    assert cost_guard.decide(20 * GiB, approved_bytes=20 * GiB) == "reject"
+
+    assert cost_guard.bytes_cap(None) == cost_guard.QUERY_MAX_BYTES
+    assert cost_guard.bytes_cap(1) == cost_guard.MIN_BILLED_BYTES
+    assert cost_guard.bytes_cap(2 * GiB) == int(2 * GiB * cost_guard.CAP_HEADROOM)
+
+
+@pytest.fixture
+def estimate(client, monkeypatch):
+    """
+    Byte estimate the (local) warehouse dry run reports; Gemini always
+    answers SQL and counts its calls.
+    """
+    from backend import main
+    from backend.warehouse import get_warehouse
+
+    state = {"bytes": None, "gemini_calls": 0}
+
+    async def fake_generate(prompt):
+        state["gemini_calls"] += 1
+        return SQL
+
+    def dry_run(sql, params=None):
+        return state["bytes"]
+
+    monkeypatch.setattr(main, "generate_sql_async", fake_generate)
+    monkeypatch.setattr(get_warehouse(), "dry_run", dry_run)
+    return state
+
+
+def test_expensive_query_needs_confirmation(client, estimate):
+    body = {"question": "which course had the most late work overall, cost guard"}
+    estimate["bytes"] = 2 * GiB
+
+    held = client.post("/query/run", json=body)
+    assert held.status_code == 409
+    held = held.json()
+    assert held["status"] == "confirmation_required"
+    assert held["bytes"]["estimated"] == 2 * GiB
+    assert estimate["gemini_calls"] == 1
+
+    confirmed = client.post("/query/run", json={**body, "confirmation": held["confirmation"]})
+    assert confirmed.status_code == 200
+    assert confirmed.json()["bytes"]["cap"] == int(2 * GiB * cost_guard.CAP_HEADROOM)
+    # the token carries the SQL: no second Gemini call
+    assert estimate["gemini_calls"] == 1
+
+
+def test_confirmation_does_not_cover_a_bigger_query(client, estimate):
+    body = {"question": "which course had the most late work overall, grown estimate"}
+    estimate["bytes"] = 2 * GiB
+    token = client.post("/query/run", json=body).json()["confirmation"]
+
+    estimate["bytes"] = 4 * GiB
+    response = client.post("/query/run", json={**body, "confirmation": token})
+    assert response.status_code == 409
+
+
+def test_over_the_limit_is_rejected(client, estimate):
+    estimate["bytes"] = cost_guard.QUERY_MAX_BYTES + 1
+    response = client.post("/query/run", json={"question": "every late submission ever, rejected"})
+
+    assert response.status_code == 400
+    assert "byte limit" in response.json()["message"]
+
+
+def test_forged_or_foreign_tokens_are_refused(client, estimate):
+    body = {"question": "which course had the most late work overall, forged"}
+    estimate["bytes"] = 2 * GiB
+    token = client.post("/query/run", json=body).json()["confirmation"]
+
+    tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    assert client.post("/query/run", json={**body, "confirmation": tampered}).status_code == 400
+
+    # a page cursor is signed with the same key but isn't a confirmation
+    cursor = encode_cursor({"table": "t", "offset": 0})
+    assert client.post("/query/run", json={**body, "confirmation": cursor}).status_code == 400
+
+    other_app = encode_cursor(
+        {"kind": "confirm", "app": "drive", "sql": SQL, "approved_bytes": 2 * GiB}
+    )
+    assert client.post("/query/run", json={**body, "confirmation": other_app}).status_code == 400
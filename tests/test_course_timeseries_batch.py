@@ -0,0 +1,33 @@
+# tests/test_course_timeseries_batch.py
+URL = "/analytics/course_timeseries/batch"
+
+
+def test_requested_courses_without_rows_get_an_empty_series(client):
+    response = client.post(URL, json={"course_ids": ["100000", "100001", "999999"], "days": 30})
+
+    assert response.status_code == 200
+    series = response.json()["series"]
+    assert sorted(series) == ["100000", "100001", "999999"]
+    assert series["100000"] and series["999999"] == []
+
+
+def test_all_courses_are_listed_even_when_the_window_is_empty(client):
+    # long before the seeded data starts
+    body = {"course_ids": "all", "days": 7, "as_of": "2001-01-01"}
+
+    rows = client.post(URL, json=body).json()
+    assert rows["row_count"] == 0
+    assert rows["course_count"] == 20
+    assert all(data == [] for data in rows["series"].values())
+
+    columnar = client.post(URL + "?format=columnar", json=body).json()
+    empty = columnar["series"]["100000"]
+    assert "metric_date" in empty["columns"]
+    assert all(values == [] for values in empty["values"])
+
+
+def test_all_courses_matches_the_course_list(client):
+    courses = client.get("/analytics/courses").json()["courses"]
+    series = client.post(URL, json={"course_ids": "all", "days": 30}).json()["series"]
+
+    assert sorted(series) == sorted(str(c["course_id"]) for c in courses)
@@ -0,0 +1,48 @@
+# tests/test_dashboard_refresh.py
+import build_dashboard_temp
+from backend import dashboard_refresh, refresh_dashboard_temp, refresh_state
+from backend.warehouse import get_warehouse
+
+
+def test_refresh_bumps_the_generation(seeded):
+    before = refresh_state.current_generation()
+
+    rows = dashboard_refresh.run()
+
+    assert rows > 0
+    assert refresh_state.current_generation() == before + 1
+    # ingestion_time is the bound refresh instant, the same on every row
+    distinct = get_warehouse().query(
+        "SELECT COUNT(DISTINCT ingestion_time) AS n FROM `proj.workspace_analytics.dashboard_temp`"
+    )
+    assert distinct[0]["n"] == 1
+
+
+def test_legacy_entry_points_run_the_same_refresh(seeded):
+    before = refresh_state.current_generation()
+
+    assert refresh_dashboard_temp.run() > 0
+    assert build_dashboard_temp.run() > 0
+
+    assert refresh_state.current_generation() == before + 2
+
+
+def test_failed_mirror_copy_is_not_served_as_the_new_generation(client, monkeypatch, caplog):
+    from backend import local_mirror
+
+    monkeypatch.setattr(local_mirror, "LOCAL_MIRROR_ENABLED", True)
+    dashboard_refresh.run()
+    assert local_mirror.is_fresh()
+    assert client.get("/analytics/courses").json()["source"] == "local_mirror"
+
+    def unavailable(table_ref):
+        raise RuntimeError("export failed")
+
+    monkeypatch.setattr(get_warehouse(), "read_arrow", unavailable)
+    with caplog.at_level("ERROR", logger="cloudreign"):
+        dashboard_refresh.run()
+
+    assert "[MIRROR] refresh after the dashboard_temp rebuild failed" in caplog.text
+    # the old copy is still on disk and young, but belongs to the last generation
+    assert not local_mirror.is_fresh()
+    assert client.get("/analytics/courses").json()["source"] == "warehouse"
@@ -0,0 +1,95 @@
+# tests/test_deadlines.py
+import asyncio
+
+from backend import deadlines
+from backend.deadlines import RequestDeadlineMiddleware
+
+
+def _scope(path="/analytics/courses", headers=()):
+    return {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+
+
+def _run(app, scope, disconnect_after: float = None):
+    """
+    Drive the middleware like a server: the request body, then (optionally)
+    http.disconnect after `disconnect_after` seconds. Returns sent messages.
+    """
+    sent = []
+
+    async def main():
+        received = {"body": False}
+
+        async def receive():
+            if not received["body"]:
+                received["body"] = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            if disconnect_after is None:
+                await asyncio.Event().wait()
+            await asyncio.sleep(disconnect_after)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await RequestDeadlineMiddleware(app)(scope, receive, send)
+
+    asyncio.run(main())
+    return sent
+
+
+def test_disconnect_after_complete_response_is_not_a_client_leaving():
+    finished = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok", "more_body": False})
+        # work after the response (e.g. background tasks) must not be cancelled
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    before = dict(deadlines.stats)
+    sent = _run(app, _scope(), disconnect_after=0.0)
+
+    assert sent[0]["status"] == 200
+    assert finished == [True]
+    assert deadlines.stats["disconnected"] == before["disconnected"]
+
+
+def test_disconnect_mid_stream_cancels_the_request():
+    cancelled = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"first", "more_body": True})
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    before = dict(deadlines.stats)
+    _run(app, _scope(), disconnect_after=0.01)
+
+    assert cancelled == [True]
+    assert deadlines.stats["disconnected"] == before["disconnected"] + 1
+
+
+def test_deadline_before_response_gives_504():
+    async def app(scope, receive, send):
+        await asyncio.sleep(5)
+
+    sent = _run(app, _scope(headers=[(b"x-request-timeout", b"0.05")]))
+
+    assert sent[0]["status"] == 504
+
+
+def test_other_paths_are_not_wrapped():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    before = dict(deadlines.stats)
+    sent = _run(app, _scope(path="/"), disconnect_after=0.0)
+
+    assert sent[0]["status"] == 204
+    assert deadlines.stats["requests"] == before["requests"]
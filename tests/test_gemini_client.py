@@ -0,0 +1,81 @@
+# tests/test_gemini_client.py
+import asyncio
+from collections import deque
+
+import pytest
+
+from backend import gemini_client
+from backend.gemini_client import GeminiTimeout, generate_sql_async, generate_text_async
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """
+    Replaces the streamed call: each attempt sleeps the next delay from
+    `delays` and answers a fenced query. Records attempts / cancellations.
+    """
+    state = {"delays": [], "attempts": 0, "cancelled": 0}
+
+    async def stream(prompt, blocks):
+        delay = state["delays"][state["attempts"]]
+        state["attempts"] += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return f"Here you go:\n```sql\nSELECT {state['attempts']};\n```\nThat's it."
+
+    monkeypatch.setattr(gemini_client, "_stream", stream)
+    monkeypatch.setattr(gemini_client, "_latencies", deque(maxlen=200))
+    return state
+
+
+def test_sql_is_extracted_from_the_fence(model):
+    model["delays"] = [0, 0]
+    assert asyncio.run(generate_sql_async("q")) == "SELECT 1"
+    # plain text comes back as the model wrote it
+    assert asyncio.run(generate_text_async("q")).startswith("Here you go:")
+
+
+def test_slow_call_times_out_and_is_cancelled(model, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_TIMEOUT_SECONDS", 0.05)
+    model["delays"] = [1]
+
+    with pytest.raises(GeminiTimeout):
+        asyncio.run(generate_sql_async("q"))
+    assert model["cancelled"] == 1
+
+
+def test_hedge_answers_when_the_first_attempt_is_slow(model, monkeypatch):
+    monkeypatch.setattr(gemini_client, "GEMINI_HEDGE", True)
+    monkeypatch.setattr(gemini_client, "GEMINI_HEDGE_MIN_SAMPLES", 3)
+    monkeypatch.setattr(gemini_client, "GEMINI_HEDGE_MIN_DELAY_MS", 20)
+    model["delays"] = [0.01, 0.01, 0.01, 1, 0.01]
+
+    async def main():
+        for _ in range(3):
+            await generate_sql_async("q")  # p95 samples, no hedge yet
+        before = dict(gemini_client.stats)
+        sql = await generate_sql_async("q")
+        return sql, before
+
+    sql, before = asyncio.run(main())
+
+    assert sql == "SELECT 5"  # the hedged attempt
+    assert gemini_client.stats["hedged"] == before["hedged"] + 1
+    assert gemini_client.stats["hedge_wins"] == before["hedge_wins"] + 1
+    assert model["cancelled"] == 1  # the slow one doesn't keep running
+
+
+@pytest.mark.parametrize(
+    "raw, sql",
+    [
+        ("```sql\nWITH t AS (SELECT 1 AS x)\nSELECT x FROM t;\n```", "WITH t AS (SELECT 1 AS x)\nSELECT x FROM t"),
+        ("Here is one with a CTE:\nwith t AS (SELECT 1 AS x) SELECT x FROM t", "with t AS (SELECT 1 AS x) SELECT x FROM t"),
+        ("bigquery\nSELECT 1;", "SELECT 1"),
+        ("Sure: SELECT 1", "SELECT 1"),
+    ],
+)
+def test_extract_sql_keeps_ctes(raw, sql):
+    assert gemini_client._extract_sql(raw) == sql
@@ -0,0 +1,102 @@
+# tests/test_nl_cache.py
+import logging
+import time
+
+from backend.nl_cache import NLCache, normalize
+
+SCHEMA = "dashboard_temp(app, course_id, metric_date, late_submissions)"
+TOP_5 = "SELECT course_id FROM t ORDER BY late_submissions DESC LIMIT 5"
+
+
+def _cache(tmp_path, **kwargs):
+    return NLCache(path=str(tmp_path / "nl_cache.json"), **kwargs)
+
+
+def test_normalize():
+    assert normalize("Show me the TOP 5 courses!") == ("top # course", ["5"])
+
+
+def test_rephrasings_and_new_numbers_reuse_the_sql(tmp_path):
+    cache = _cache(tmp_path, similarity=0.7)
+    cache.put("top 5 courses by late submissions", "classroom:100", SCHEMA, TOP_5)
+
+    exact = cache.get("Show me the TOP 5 courses by late submissions?", "classroom:100", SCHEMA)
+    assert exact["match"] == "exact" and exact["sql"] == TOP_5
+
+    # the number is a slot: same question with another limit
+    assert cache.get("top 12 courses by late submissions", "classroom:100", SCHEMA)["sql"].endswith(
+        "LIMIT 12"
+    )
+
+    fuzzy = cache.get("top 5 courses by late submission count", "classroom:100", SCHEMA)
+    assert fuzzy["match"] == "fuzzy" and fuzzy["similarity"] >= cache.similarity
+
+
+def test_different_questions_scopes_and_negations_miss(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("top 5 courses by late submissions", "classroom:100", SCHEMA, TOP_5)
+
+    assert cache.get("top 5 courses by late submissions", "classroom:10", SCHEMA) is None
+    assert cache.get("average grade per teacher", "classroom:100", SCHEMA) is None
+    assert cache.get("top 5 courses not by late submissions", "classroom:100", SCHEMA) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_schema_change_drops_everything(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("top 5 courses by late submissions", "classroom:100", SCHEMA, TOP_5)
+
+    assert cache.get("top 5 courses by late submissions", "classroom:100", SCHEMA + ", x") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_persisted_and_bounded(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    for n, question in enumerate(["late work per course", "grades per course", "students per course"]):
+        cache.put(question, "classroom:100", SCHEMA, f"SELECT {n}")
+    assert cache.stats()["evictions"] == 1
+    cache.flush()
+
+    reloaded = _cache(tmp_path)
+    assert reloaded.get("late work per course", "classroom:100", SCHEMA) is None
+    assert reloaded.get("students per course", "classroom:100", SCHEMA)["sql"] == "SELECT 2"
+
+
+def test_put_does_not_write_but_the_timer_does(tmp_path):
+    cache = _cache(tmp_path, save_delay=0.05)
+    cache.put("late work per course", "classroom:100", SCHEMA, "SELECT 1")
+    cache.put("grades per course", "classroom:100", SCHEMA, "SELECT 2")
+
+    assert not (tmp_path / "nl_cache.json").exists()
+    assert cache.stats()["unsaved"]
+
+    time.sleep(0.3)
+    stats = cache.stats()
+    assert stats["saves"] == 1 and not stats["unsaved"]  # one write for both puts
+    assert _cache(tmp_path).get("grades per course", "classroom:100", SCHEMA)["sql"] == "SELECT 2"
+
+
+def test_workers_sharing_a_file_keep_each_others_entries(tmp_path):
+    first, second = _cache(tmp_path), _cache(tmp_path)
+    first.put("late work per course", "classroom:100", SCHEMA, "SELECT 1")
+    second.put("grades per course", "classroom:100", SCHEMA, "SELECT 2")
+    first.flush()
+    second.flush()
+
+    reloaded = _cache(tmp_path)
+    assert reloaded.get("late work per course", "classroom:100", SCHEMA)["sql"] == "SELECT 1"
+    assert reloaded.get("grades per course", "classroom:100", SCHEMA)["sql"] == "SELECT 2"
+    # the second worker picked up the first one's entry too
+    assert second.get("late work per course", "classroom:100", SCHEMA)["sql"] == "SELECT 1"
+
+
+def test_save_failure_is_logged_not_raised(tmp_path, caplog):
+    cache = NLCache(path=str(tmp_path / "missing" / "nl_cache.json"))
+
+    with caplog.at_level(logging.ERROR, logger="cloudreign"):
+        cache.put("late work per course", "classroom:100", SCHEMA, "SELECT 1")
+        cache.flush()
+
+    assert cache.get("late work per course", "classroom:100", SCHEMA)["sql"] == "SELECT 1"
+    assert "[NL CACHE] could not save" in caplog.text
+    assert cache.stats()["unsaved"]  # tried again later
@@ -0,0 +1,100 @@
+# tests/test_nl_to_sql.py
+from datetime import date, timedelta
+
+from backend.nl_to_sql import nl_to_sql
+from backend.sql_guard import QUERY_MAX_LOOKBACK_DAYS, QUERY_MAX_ROWS
+
+AS_OF = date(2026, 10, 18)
+
+
+def test_ranking_template_binds_parameters():
+    match = nl_to_sql("classroom", "top 5 courses by late submissions", as_of=AS_OF)
+
+    assert match["intent"] == "top_courses_by_metric"
+    assert match["confidence"] >= 0.8
+    assert match["params"]["limit"] == 5
+    assert "ORDER BY late_submissions DESC" in match["sql"]
+    assert "@app" in match["sql"] and "classroom" not in match["sql"]
+
+
+def test_trend_and_teacher_templates():
+    trend = nl_to_sql("classroom", "weekly submissions trend for course 100003", as_of=AS_OF)
+    assert trend["intent"] == "course_trend"
+    assert trend["params"]["course"] == "100003"
+    assert "WEEK(MONDAY)" in trend["sql"]
+
+    teacher = nl_to_sql("classroom", "which courses does teacher3@example.com teach", as_of=AS_OF)
+    assert teacher["intent"] == "teacher_courses"
+    assert teacher["params"]["teacher_email"] == "teacher3@example.com"
+
+
+def test_unrelated_question_is_left_to_the_model():
+    assert nl_to_sql("classroom", "why do students like group projects", as_of=AS_OF) is None
+
+
+def test_impossible_date_is_no_match():
+    for question in (
+        "late submissions by course since 2024-02-30",
+        "top courses by grade between 2024-01-01 and 2024-13-01",
+        "submissions trend on 2023-02-29",
+    ):
+        assert nl_to_sql("classroom", question, as_of=AS_OF) is None
+
+
+def test_limit_is_clamped():
+    match = nl_to_sql(
+        "classroom", "top 50000 courses by late submissions", max_rows=10**6, as_of=AS_OF
+    )
+    assert match["params"]["limit"] == QUERY_MAX_ROWS
+
+
+def test_range_outside_the_lookback_is_left_to_the_model():
+    earliest = AS_OF - timedelta(days=QUERY_MAX_LOOKBACK_DAYS)
+    for question in (
+        "top 5 courses by late submissions between 2024-01-01 and 2024-12-31",
+        f"top 5 courses by late submissions between {earliest - timedelta(days=1)} and {AS_OF}",
+        "top 5 courses by late submissions between 2026-10-01 and 2030-01-01",
+        "submissions trend over the last 2 years",
+    ):
+        assert nl_to_sql("classroom", question, as_of=AS_OF) is None, question
+
+    inside = nl_to_sql(
+        "classroom", f"top 5 courses by late submissions between {earliest} and {AS_OF}", as_of=AS_OF
+    )
+    assert (inside["params"]["start_date"], inside["params"]["end_date"]) == (earliest, AS_OF)
+
+
+def test_course_name_skips_the_metric_phrase():
+    for question in (
+        "trend of late submissions for Algebra",
+        "show the trend of submissions in Algebra over the last 2 weeks",
+    ):
+        match = nl_to_sql("classroom", question, as_of=AS_OF)
+        assert match["intent"] == "course_trend", question
+        assert match["params"]["course"] == "Algebra", question
+
+    # ... and still reads the date phrase after the name
+    assert match["params"]["start_date"] == AS_OF - timedelta(days=14)
+
+
+def test_course_name_with_metric_words_is_left_to_the_model():
+    assert nl_to_sql("classroom", "who teaches the late submissions class", as_of=AS_OF) is None
+
+
+def test_bad_date_falls_back_to_gemini(client, monkeypatch):
+    from backend import main
+
+    asked = []
+
+    async def fake_generate(prompt):
+        asked.append(prompt)
+        return "SELECT course_id FROM `proj.workspace_analytics.dashboard_temp`"
+
+    monkeypatch.setattr(main, "generate_sql_async", fake_generate)
+    response = client.post(
+        "/query/nl", json={"question": "late submissions by course since 2024-02-30"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["template"] is None
+    assert len(asked) == 1
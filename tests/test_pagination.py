@@ -0,0 +1,72 @@
+# tests/test_pagination.py
+from backend import warehouse
+
+
+def _result_tables():
+    cur = warehouse.get_warehouse()._cursor()
+    try:
+        return {
+            name
+            for (name,) in cur.execute(
+                "SELECT table_name FROM duckdb_tables() WHERE schema_name = '_results'"
+            ).fetchall()
+        }
+    finally:
+        cur.close()
+
+
+def test_paged_checkpoint_reads_every_row_then_drops_its_table(client):
+    first = client.post("/query/checkpoint", json={"limit": 25, "page_size": 10}).json()
+    rows = list(first["data"])
+    cursor = first["next_cursor"]
+    assert cursor and len(rows) == 10
+
+    while cursor:
+        page = client.post("/query/page", json={"cursor": cursor, "page_size": 10}).json()
+        rows += page["data"]
+        cursor = page["next_cursor"]
+
+    assert len(rows) == 25
+    assert not any(name for name in _result_tables())
+    # pages follow the query's ORDER BY metric_date DESC
+    dates = [row["metric_date"] for row in rows]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_row_numbers_follow_the_order_by():
+    sql = warehouse._row_numbered(
+        "SELECT course_id FROM t GROUP BY course_id ORDER BY SUM(late_submissions) DESC, 1"
+    )
+    assert "ROW_NUMBER() OVER (ORDER BY \"_order_0\" DESC, \"course_id\"" in sql
+    assert "EXCLUDE (_order_0)" in sql
+
+
+def test_abandoned_cursor_table_is_swept(client, monkeypatch):
+    abandoned = client.post("/query/checkpoint", json={"limit": 25, "page_size": 10}).json()
+    before = _result_tables()
+    assert len(before) == 1
+
+    # every existing table is past its TTL now
+    monkeypatch.setattr(warehouse, "LOCAL_RESULT_TTL_SECONDS", -10)
+    client.post("/query/checkpoint", json={"limit": 25, "page_size": 10})
+
+    assert not before & _result_tables()
+    response = client.post(
+        "/query/page", json={"cursor": abandoned["next_cursor"], "page_size": 10}
+    )
+    assert response.status_code == 500
+
+
+def test_tampered_cursor_is_rejected(client):
+    response = client.post("/query/page", json={"cursor": "bm90LWEtY3Vyc29y", "page_size": 10})
+    assert response.status_code == 400
+
+
+def test_unpaged_checkpoint_is_cached(client):
+    body = {"limit": 40}
+    first = client.post("/query/checkpoint", json=body)
+    second = client.post("/query/checkpoint", json=body)
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json()["data"] == first.json()["data"]
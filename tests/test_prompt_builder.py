@@ -0,0 +1,74 @@
+# tests/test_prompt_builder.py
+import pytest
+
+from backend import prompt_builder
+from backend.prompt_builder import EXAMPLES, FALLBACK_SCHEMA, build_sql_prompt, relevant_examples
+
+SCHEMA = prompt_builder._render_schema(FALLBACK_SCHEMA)
+TABLE = prompt_builder.TABLE_ID
+
+QUESTIONS = [q for q, _ in EXAMPLES] + [
+    "Which courses had no submissions in the last 7 days?",
+    "What share of submissions were late for each teacher this month?",
+    "Compare average grades between sections",
+    "How many students are enrolled across all courses?",
+    "Which days of the week get the most submissions?",
+    "top 5 courses by late submissions",
+    "why do students like group projects",
+]
+
+
+def old_prompt(question: str, max_rows: int = 100) -> str:
+    # the hand-written /query/run prompt the builder replaced
+    return f"""
+You are an expert data analyst. Generate a valid BigQuery SQL query for the
+`{TABLE}` table.
+
+The schema of dashboard_temp is:
+
+- app STRING
+- metric_date DATE
+- course_id STRING
+- course_name STRING
+- section STRING
+- primary_teacher_email STRING
+- total_students INT64
+- total_submissions INT64
+- turned_in_submissions INT64
+- returned_submissions INT64
+- late_submissions INT64
+- avg_grade BIGNUMERIC
+- max_grade FLOAT64
+- ingestion_time TIMESTAMP
+
+Rules:
+- Only query from `{TABLE}`.
+- Always filter `app = 'classroom'`.
+- Return at most {max_rows} rows using LIMIT.
+- Use standard SQL, no legacy syntax.
+- Wrap ONLY the SQL in a ```sql ... ``` block.
+
+User question:
+\"\"\"{question}\"\"\".
+"""
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_prompt_is_shorter_than_the_old_one(question):
+    prompt = build_sql_prompt(question, "classroom", 100, SCHEMA)
+    assert len(prompt) < len(old_prompt(question))
+
+
+def test_bare_prompt_is_well_under_the_old_one():
+    question = "why do students like group projects"
+    assert relevant_examples(question) == []
+    assert len(build_sql_prompt(question, "classroom", 100, SCHEMA)) < 0.65 * len(old_prompt(question))
+
+
+def test_at_most_one_close_example():
+    assert relevant_examples("late share per teacher this month") == [EXAMPLES[1]]
+    assert relevant_examples("top 5 courses by late submissions") == []
+    for question in QUESTIONS:
+        assert len(relevant_examples(question)) <= 1
+        prompt = build_sql_prompt(question, "classroom", 100, SCHEMA)
+        assert prompt.count("```sql") == len(relevant_examples(question)) + 1
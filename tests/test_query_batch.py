@@ -0,0 +1,86 @@
+# tests/test_query_batch.py
+import pytest
+
+from backend.gemini_client import GeminiTimeout
+
+T = "`proj.workspace_analytics.dashboard_temp`"
+COUNT_SQL = f"SELECT COUNT(*) AS n FROM {T}"
+LATE_SQL = f"SELECT course_id, SUM(late_submissions) AS late FROM {T} GROUP BY course_id"
+
+
+@pytest.fixture
+def gemini(client, monkeypatch):
+    """
+    Scripted model: `batch` is what the batch call answers (or an exception
+    to raise); single calls answer `single`. Records every call.
+    """
+    from backend import main
+
+    state = {"batch": None, "single": COUNT_SQL, "batch_calls": [], "single_calls": 0}
+
+    async def batch(prompt, count):
+        state["batch_calls"].append(count)
+        if isinstance(state["batch"], Exception):
+            raise state["batch"]
+        return state["batch"]
+
+    async def single(prompt):
+        state["single_calls"] += 1
+        return state["single"]
+
+    monkeypatch.setattr(main, "generate_sql_batch_async", batch)
+    monkeypatch.setattr(main, "generate_sql_async", single)
+    return state
+
+
+def test_one_model_call_and_shared_queries(client, gemini):
+    questions = [
+        "how many dashboard rows are stored altogether",
+        "tardiness tally for each classroom",
+        "overall row total in the metrics table",
+    ]
+    gemini["batch"] = [COUNT_SQL, LATE_SQL, COUNT_SQL]
+
+    response = client.post("/query/batch", json={"questions": questions})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert gemini["batch_calls"] == [3] and gemini["single_calls"] == 0
+    assert body["model_calls"] == 1 and body["distinct_queries"] == 2
+
+    results = body["results"]
+    assert [r["question"] for r in results] == questions
+    assert all(r["status"] == "ok" for r in results)
+    assert results[2]["duplicate_of"] == 0 and results[2]["data"] == results[0]["data"]
+    assert results[1]["duplicate_of"] is None and results[1]["row_count"] > 0
+
+
+def test_unanswered_or_invalid_questions_are_handled_on_their_own(client, gemini):
+    questions = ["pupils enrolled per section roster", "submissions dropped into a foreign table"]
+    gemini["batch"] = [None, "SELECT * FROM `proj.workspace_analytics.classroom_submissions`"]
+
+    results = client.post("/query/batch", json={"questions": questions}).json()["results"]
+
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert [a["stage"] for a in results[0]["attempts"]] == ["generate"]
+    assert [a["stage"] for a in results[1]["attempts"]] == ["batch", "repair"]
+    assert gemini["single_calls"] == 2
+
+
+def test_model_timeout_fails_only_the_model_answers(client, gemini):
+    gemini["batch"] = GeminiTimeout("Gemini did not answer within 0.1s")
+
+    response = client.post("/query/batch", json={"questions": ["weekday grading cadence chart"]})
+
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert result["status"] == "error" and "did not answer" in result["message"]
+
+
+def test_question_count_is_bounded(client, gemini):
+    from backend.main import QUERY_BATCH_MAX_QUESTIONS
+
+    assert client.post("/query/batch", json={"questions": []}).status_code == 400
+    too_many = [f"question {n}" for n in range(QUERY_BATCH_MAX_QUESTIONS + 1)]
+    assert client.post("/query/batch", json={"questions": too_many}).status_code == 400
+    assert gemini["batch_calls"] == []
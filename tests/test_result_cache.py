@@ -0,0 +1,59 @@
+# tests/test_result_cache.py
+from backend import refresh_state
+from backend.result_cache import ResultCache
+
+
+def test_hit_after_put_and_lru_eviction():
+    cache = ResultCache(max_bytes=10)
+    generation = refresh_state.current_generation()
+
+    assert cache.put("a", {"x": 1}, b"12345", generation)
+    assert cache.put("b", {}, b"12345", generation)
+    assert cache.get("a", {"x": 1}) == b"12345"  # now most recent
+
+    cache.put("c", {}, b"123", generation)
+    assert cache.get("b", {}) is None
+    assert cache.get("a", {"x": 1}) == b"12345"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_refresh_drops_everything():
+    cache = ResultCache()
+    cache.put("a", {}, b"old", refresh_state.current_generation())
+
+    refresh_state.bump()
+
+    assert cache.get("a", {}) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_built_across_a_refresh_is_not_stored():
+    cache = ResultCache()
+    started_under = refresh_state.current_generation()
+
+    # the refresh lands while the (pre-refresh) result is being built
+    refresh_state.bump()
+
+    assert not cache.put("a", {}, b"stale", started_under)
+    assert cache.get("a", {}) is None
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_route_does_not_cache_a_build_that_straddled_a_refresh(client, monkeypatch):
+    from backend import main
+
+    real_build = main._analytics_courses
+
+    async def build_then_refresh(response_format):
+        response = await real_build(response_format)
+        refresh_state.bump()
+        return response
+
+    monkeypatch.setattr(main, "_analytics_courses", build_then_refresh)
+    first = client.get("/analytics/courses")
+    monkeypatch.setattr(main, "_analytics_courses", real_build)
+    second = client.get("/analytics/courses")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "MISS"
+    assert client.get("/analytics/courses").headers["X-Cache"] == "HIT"
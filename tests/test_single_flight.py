@@ -0,0 +1,108 @@
+# tests/test_single_flight.py
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    async def main():
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.02)
+            return "rows"
+
+        results = await asyncio.gather(*(flights.do("k", work) for _ in range(5)))
+        # finished calls aren't kept: the next caller runs again
+        await flights.do("k", work)
+        return results, runs, flights.stats()
+
+    results, runs, stats = asyncio.run(main())
+    assert results == ["rows"] * 5
+    assert len(runs) == 2
+    assert stats["shared"] == 4 and stats["in_flight"] == 0
+
+
+def test_errors_reach_every_caller():
+    async def main():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("job failed")
+
+        return await asyncio.gather(
+            flights.do("k", work), flights.do("k", work), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    async def main():
+        flights = SingleFlight()
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "rows"
+
+        leaver = asyncio.create_task(flights.do("k", work))
+        stayer = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        leaver.cancel()
+        return await stayer, cancelled
+
+    result, cancelled = asyncio.run(main())
+    assert result == "rows" and not cancelled
+
+
+def test_last_caller_leaving_cancels_the_work():
+    async def main():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flights.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        with pytest.raises(asyncio.CancelledError):
+            await callers[0]
+        await asyncio.sleep(0)
+        return flights.stats()
+
+    assert asyncio.run(main())["in_flight"] == 0
+
+
+def test_dashboard_reads_are_coalesced(client):
+    from backend import main
+
+    async def burst():
+        # same query from several requests at once -> one warehouse job
+        sql = f"SELECT COUNT(*) AS n FROM `proj.workspace_analytics.dashboard_temp` -- {id(burst)}"
+        return await asyncio.gather(*(main.fetch_dashboard(sql) for _ in range(4)))
+
+    before = main.query_flights.stats()
+    results = asyncio.run(burst())
+    after = main.query_flights.stats()
+
+    assert len({r[0].column("n")[0].as_py() for r in results}) == 1
+    assert after["executions"] - before["executions"] == 1
+    assert after["shared"] - before["shared"] == 3
@@ -0,0 +1,48 @@
+# tests/test_snapshots.py
+import json
+import os
+from datetime import date
+
+from backend import refresh_state, snapshots
+from backend.warehouse import get_warehouse
+
+BATCH = "/analytics/course_timeseries/batch"
+# fields that say where a payload came from, not what it holds
+_ORIGIN = ("source", "cache_hit")
+
+
+def _payload(response) -> dict:
+    return {k: v for k, v in response.json().items() if k not in _ORIGIN}
+
+
+def test_snapshots_match_the_live_routes(client, monkeypatch):
+    requests = [
+        ("GET", "/analytics/courses", None),
+        ("POST", BATCH, {"course_ids": "all"}),
+        ("POST", "/analytics/course_timeseries", {"course_id": "100003"}),
+        ("POST", "/analytics/course_detail", {"course_id": "100003"}),
+    ]
+    refresh_state.bump()  # nothing cached from earlier tests
+    live = [client.request(method, url, json=body) for method, url, body in requests]
+    assert all(r.headers["x-cache"] == "MISS" for r in live)
+
+    monkeypatch.setattr(snapshots, "SNAPSHOTS_ENABLED", True)
+    snapshots.render(get_warehouse(), refresh_state.current_generation())
+    served = [client.request(method, url, json=body) for method, url, body in requests]
+    assert all(r.headers["x-cache"] == "SNAPSHOT" for r in served)
+
+    for (_, url, _), a, b in zip(requests, live, served):
+        assert _payload(a) == _payload(b), url
+
+
+def test_batch_snapshot_lists_courses_without_rows(seeded, monkeypatch):
+    # a default window long before the seeded data: every course still gets a series
+    monkeypatch.setattr(snapshots, "today_utc", lambda: date(2001, 1, 1))
+    generation = refresh_state.current_generation()
+    snapshots.render(get_warehouse(), generation)
+
+    name = snapshots.snapshot_name("analytics_course_timeseries_batch")
+    with open(os.path.join(snapshots.SNAPSHOT_DIR, str(generation), name)) as f:
+        body = json.load(f)
+    assert body["course_count"] == 20 and body["row_count"] == 0
+    assert all(rows == [] for rows in body["series"].values())
@@ -0,0 +1,93 @@
+# tests/test_sql_guard.py
+import pytest
+import sqlglot
+from sqlglot import exp
+
+from backend.sql_guard import QUERY_MAX_ROWS, UnsafeQuery, enforce
+
+T = "`proj.workspace_analytics.dashboard_temp`"
+
+
+def _tree(sql: str):
+    return sqlglot.parse_one(sql, read="bigquery")
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        f"DELETE FROM {T} WHERE TRUE",
+        f"CREATE TABLE x AS SELECT * FROM {T}",
+        f"SELECT 1 FROM {T}; SELECT 2 FROM {T}",
+        "SELECT * FROM `proj.workspace_analytics.classroom_submissions`",
+        "SELECT * FROM `other.workspace_analytics.dashboard_temp`",
+        f"SELECT * FROM {T} WHERE course_id IN (SELECT user_id FROM `proj.raw.users`)",
+        "SELECT FROM WHERE",
+    ],
+)
+def test_unsafe_queries_are_refused(sql):
+    with pytest.raises(UnsafeQuery):
+        enforce(sql, "classroom", 100)
+
+
+def test_missing_filters_and_limit_are_added():
+    tree = _tree(enforce(f"SELECT course_id FROM {T}", "classroom", 100))
+
+    where = tree.args["where"].sql(dialect="bigquery")
+    assert "app = 'classroom'" in where
+    assert "metric_date >= DATE_SUB(CURRENT_DATE" in where
+    assert tree.args["limit"].expression.this == "100"
+
+
+def test_existing_filters_are_kept_and_limit_clamped():
+    sql = f"""
+    SELECT course_id FROM {T}
+    WHERE app = 'classroom' AND metric_date BETWEEN '2024-01-01' AND '2024-02-01'
+    LIMIT 999999999
+    """
+    tree = _tree(enforce(sql, "classroom", 10**9))
+
+    assert len(list(tree.args["where"].find_all(exp.EQ))) == 1
+    assert len(list(tree.args["where"].find_all(exp.DateSub))) == 0
+    assert int(tree.args["limit"].expression.this) == QUERY_MAX_ROWS
+
+
+def test_lower_bound_follows_an_existing_upper_bound():
+    sql = f"SELECT course_id FROM {T} WHERE app = 'classroom' AND metric_date < '2020-01-01'"
+    where = _tree(enforce(sql, "classroom", 10)).args["where"].sql(dialect="bigquery")
+
+    # a historical question keeps its rows: the window ends at its own bound
+    assert "metric_date >= DATE_SUB(CAST('2020-01-01' AS DATE), INTERVAL '365' DAY)" in where
+    assert "CURRENT_DATE" not in where
+
+
+def test_other_app_filter_does_not_count():
+    where = _tree(enforce(f"SELECT * FROM {T} WHERE app = 'drive'", "classroom", 10)).args["where"]
+    assert "app = 'classroom'" in where.sql(dialect="bigquery")
+
+
+def test_joined_tables_are_filtered_in_the_on_clause():
+    sql = f"""
+    SELECT a.course_id FROM {T} AS a
+    LEFT JOIN `proj.workspace_analytics.dashboard_temp_weekly` AS w
+      ON a.course_id = w.course_id
+    WHERE a.app = 'classroom' AND a.metric_date >= '2024-01-01'
+    """
+    tree = _tree(enforce(sql, "classroom", 10))
+
+    on = tree.find(exp.Join).args["on"].sql(dialect="bigquery")
+    assert "w.app = 'classroom'" in on and "w.metric_date >=" in on
+    assert tree.find(exp.Join).side == "LEFT"
+
+
+def test_ctes_and_unions_are_handled():
+    sql = f"""
+    WITH recent AS (SELECT course_id FROM {T})
+    SELECT course_id FROM recent
+    UNION ALL
+    SELECT course_id FROM `proj.workspace_analytics.dashboard_temp_monthly`
+    """
+    out = enforce(sql, "classroom", 50)
+    tree = _tree(out)
+
+    assert out.count("app = 'classroom'") == 2
+    assert isinstance(tree, exp.Union) and tree.args["limit"].expression.this == "50"
@@ -0,0 +1,96 @@
+# tests/test_sql_repair.py
+import asyncio
+
+import pytest
+
+from backend.sql_repair import InvalidSQL, RepairFailed, validate_and_repair
+
+GOOD = "SELECT course_id FROM `proj.workspace_analytics.dashboard_temp`"
+
+
+def _model(*answers):
+    prompts = []
+
+    async def generate(prompt):
+        prompts.append(prompt)
+        return answers[len(prompts) - 1]
+
+    return generate, prompts
+
+
+async def _validate(sql):
+    if "dashboard_temp" not in sql:
+        raise InvalidSQL(f"Table not allowed in: {sql}")
+    return "ok"
+
+
+def test_error_goes_back_to_the_model_until_it_validates():
+    generate, prompts = _model("SELECT * FROM users", GOOD)
+
+    sql, result, attempts = asyncio.run(validate_and_repair("PROMPT", generate, _validate))
+
+    assert (sql, result) == (GOOD, "ok")
+    assert [a["stage"] for a in attempts] == ["generate", "repair"]
+    assert attempts[0]["error"] and attempts[1]["error"] is None
+    assert "SELECT * FROM users" in prompts[1] and "Table not allowed" in prompts[1]
+
+
+def test_gives_up_after_the_repairs():
+    generate, prompts = _model("SELECT 1", "SELECT 2", "SELECT 3")
+
+    with pytest.raises(RepairFailed) as e:
+        asyncio.run(validate_and_repair("PROMPT", generate, _validate, max_repairs=2))
+
+    assert len(prompts) == 3 and len(e.value.attempts) == 3
+    assert e.value.sql == "SELECT 3"
+
+
+def test_given_sql_is_validated_before_asking_the_model():
+    generate, prompts = _model(GOOD)
+
+    sql, _, attempts = asyncio.run(
+        validate_and_repair("PROMPT", generate, _validate, sql=GOOD, sql_stage="cached")
+    )
+    assert sql == GOOD and prompts == [] and attempts[0]["stage"] == "cached"
+
+    # a given query that's invalid is repaired like a generated one ...
+    sql, _, attempts = asyncio.run(
+        validate_and_repair("PROMPT", generate, _validate, sql="SELECT 1")
+    )
+    assert sql == GOOD and [a["stage"] for a in attempts] == ["given", "repair"]
+
+    # ... unless repairs are off (a confirmed query)
+    with pytest.raises(RepairFailed):
+        asyncio.run(validate_and_repair("PROMPT", generate, _validate, sql="SELECT 1", max_repairs=0))
+
+
+def test_route_repairs_and_reports_attempts(client, monkeypatch):
+    from backend import main
+
+    generate, prompts = _model(
+        "SELECT * FROM `proj.workspace_analytics.classroom_submissions`", GOOD
+    )
+    monkeypatch.setattr(main, "generate_sql_async", generate)
+
+    response = client.post("/query/run", json={"question": "courses listed for the repair loop"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [a["stage"] for a in body["attempts"]] == ["generate", "repair"]
+    assert "Table not allowed" in body["attempts"][0]["error"]
+
+
+def test_route_answers_400_once_repairs_are_used_up(client, monkeypatch):
+    from backend import main
+
+    async def generate(prompt):
+        return "DROP TABLE `proj.workspace_analytics.dashboard_temp`"
+
+    monkeypatch.setattr(main, "generate_sql_async", generate)
+
+    response = client.post("/query/run", json={"question": "courses listed, never valid"})
+
+    assert response.status_code == 400
+    body = response.json()
+    assert len(body["attempts"]) == main.SQL_REPAIR_ATTEMPTS + 1
+    assert "failed validation" in body["message"]